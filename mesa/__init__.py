@@ -12,7 +12,7 @@ import mesa.time as time
 import mesa.space as space
 import mesa.flat.visualization as visualization
 from mesa.datacollection import DataCollector
-from mesa.batchrunner import batch_run  # noqa
+from mesa.batchrunner import batch_run, batch_run_to_file, iter_batch_run  # noqa
 
 __all__ = [
     "Model",
@@ -22,6 +22,8 @@ __all__ = [
     "visualization",
     "DataCollector",
     "batch_run",
+    "batch_run_to_file",
+    "iter_batch_run",
 ]
 
 __title__ = "mesa"
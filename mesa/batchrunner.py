@@ -4,16 +4,28 @@ Batchrunner
 
 A single class to manage a batch run or parameter sweep of a given model.
 """
+import contextlib
 import copy
+import hashlib
+import importlib
+import inspect
 import itertools
+import json
+import os
+import pickle
+import queue
 import random
-from functools import partial
+import tempfile
+import time
+from functools import lru_cache, partial
 from itertools import count, product
 from multiprocessing import Pool, cpu_count
 from warnings import warn
 from typing import (
     Any,
+    Callable,
     Dict,
+    Iterator,
     Iterable,
     List,
     Mapping,
@@ -38,6 +50,13 @@ def batch_run(
     data_collection_period: int = -1,
     max_steps: int = 1000,
     display_progress: bool = True,
+    chunksize: Optional[int] = None,
+    expected_cost: Optional[Callable[[Dict[str, Any]], float]] = None,
+    pool: Optional[Pool] = None,
+    checkpoint_dir: Optional[str] = None,
+    cache_dir: Optional[str] = None,
+    cache_max_bytes: int = 2**30,
+    collection_schedule: Optional[Union[int, str, Iterable[int]]] = None,
 ) -> List[Dict[str, Any]]:
     """Batch run a mesa model with a set of parameter values.
 
@@ -57,42 +76,577 @@ def batch_run(
         Maximum number of model steps after which the model halts, by default 1000
     display_progress : bool, optional
         Display batch run process, by default True
+    chunksize : int, optional
+        Number of runs sent to a worker process at a time. By default the
+        chunk size adapts to the measured run duration, so that a chunk takes
+        about `_CHUNK_SECONDS`, and shrinks towards the end of the sweep.
+    expected_cost : Callable[[Dict[str, Any]], float], optional
+        Function of the model kwargs of a run that estimates how long the run
+        takes. Runs are then started longest-expected first, so long runs do
+        not end up alone at the tail of the sweep.
+    pool : multiprocessing.Pool, optional
+        Process pool to run on, e.g. to reuse one pool for several sweeps;
+        it is not closed afterwards. `number_processes` should be its number
+        of processes.
+    checkpoint_dir : str, optional
+        Directory in which every finished run is recorded, with its rows. If
+        the sweep is started again with the same directory, runs recorded
+        there are not run again; their stored rows are returned instead. A
+        run is identified by a hash of the model class, its class attribute
+        configuration, max_steps, data_collection_period,
+        collection_schedule, RunId, iteration and kwargs, so runs of another
+        configuration are run again.
+    cache_dir : str, optional
+        Directory of a result cache shared by all sweeps that use it. Runs
+        with an explicit `seed` parameter are looked up there by a hash of
+        the model class, the source code of its package, its class
+        attribute configuration (e.g. `PredatorPrey.collect_agent_vars`),
+        the kwargs (seed included), max_steps, data_collection_period and
+        collection_schedule, and are only run if they are not cached yet.
+        Runs without a seed are never cached.
+    cache_max_bytes : int, optional
+        Size above which the least recently used results are evicted from
+        the cache, by default 1 GiB
+    collection_schedule : Union[int, str, Iterable[int]], optional
+        Collection schedule set on the data collector of every model, see
+        `DataCollector.set_collection_schedule`: every k steps, "end" or the
+        given steps, e.g. from `mesa.datacollection.log_spaced_steps`. The
+        model then only evaluates its reporters at these steps and at its
+        final step, and a row is returned for each of them, with the step
+        of the collection as Step; `data_collection_period` is ignored. By
+        default the model collects every step and `data_collection_period`
+        selects the rows afterwards.
 
     Returns
     -------
     List[Dict[str, Any]]
         [description]
     """
+    results: List[Dict[str, Any]] = []
+    for data in iter_batch_run(
+        model_cls,
+        parameters,
+        number_processes=number_processes,
+        iterations=iterations,
+        data_collection_period=data_collection_period,
+        max_steps=max_steps,
+        display_progress=display_progress,
+        chunksize=chunksize,
+        expected_cost=expected_cost,
+        pool=pool,
+        checkpoint_dir=checkpoint_dir,
+        cache_dir=cache_dir,
+        cache_max_bytes=cache_max_bytes,
+        collection_schedule=collection_schedule,
+    ):
+        results.extend(data)
+    return results
+
+
+def iter_batch_run(
+    model_cls: Type[Model],
+    parameters: Mapping[str, Union[Any, Iterable[Any]]],
+    number_processes: Optional[int] = 1,
+    iterations: int = 1,
+    data_collection_period: int = -1,
+    max_steps: int = 1000,
+    display_progress: bool = True,
+    chunksize: Optional[int] = None,
+    expected_cost: Optional[Callable[[Dict[str, Any]], float]] = None,
+    pool: Optional[Pool] = None,
+    checkpoint_dir: Optional[str] = None,
+    cache_dir: Optional[str] = None,
+    cache_max_bytes: int = 2**30,
+    collection_schedule: Optional[Union[int, str, Iterable[int]]] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    """Batch run a mesa model like `batch_run`, but yield the rows of each run
+    as soon as the run is done instead of collecting all of them in a list.
+
+    The parameters are those of `batch_run`. Only the rows of the runs in
+    flight are held in memory. With a `checkpoint_dir`, the rows of runs
+    finished by an earlier call are yielded first.
+
+    Yields
+    ------
+    List[Dict[str, Any]]
+        The rows of one run, in the format of `batch_run`
+    """
 
-    runs_list = []
-    run_id = 0
-    for iteration in range(iterations):
-        for kwargs in _make_model_kwargs(parameters):
-            runs_list.append((run_id, iteration, kwargs))
-            run_id += 1
+    kwargs_list = _make_model_kwargs(parameters)
+    total_runs = iterations * len(kwargs_list)
+    runs: Iterable[Tuple[int, int, Dict[str, Any]]] = (
+        (iteration * len(kwargs_list) + index, iteration, kwargs)
+        for iteration in range(iterations)
+        for index, kwargs in enumerate(kwargs_list)
+    )
+    if expected_cost is not None:
+        runs = sorted(runs, key=lambda run: expected_cost(run[2]), reverse=True)
+    if collection_schedule is not None and not isinstance(
+        collection_schedule, (int, str)
+    ):
+        # A sorted tuple is cheap to send to workers and hashes stably
+        collection_schedule = tuple(sorted(set(collection_schedule)))
 
     process_func = partial(
         _model_run_func,
         model_cls,
         max_steps=max_steps,
         data_collection_period=data_collection_period,
+        cache=_ResultCache(cache_dir, cache_max_bytes)
+        if cache_dir is not None
+        else None,
+        collection_schedule=collection_schedule,
     )
 
-    results: List[Dict[str, Any]] = []
+    run_key = partial(
+        _run_key,
+        model_cls,
+        max_steps=max_steps,
+        data_collection_period=data_collection_period,
+        collection_schedule=collection_schedule,
+    )
 
-    with tqdm(total=len(runs_list), disable=not display_progress) as pbar:
-        if number_processes == 1:
-            for run in runs_list:
-                data = process_func(run)
-                results.extend(data)
+    with contextlib.ExitStack() as stack:
+        checkpoint = None
+        runs_to_do = total_runs
+        if checkpoint_dir is not None:
+            checkpoint = stack.enter_context(_SweepCheckpoint(checkpoint_dir))
+            keyed_runs = [(run_key(run), run) for run in runs]
+            # The directory may also hold runs of other sweeps; skip those
+            yield from checkpoint.stored_results({key for key, _ in keyed_runs})
+            runs = [run for key, run in keyed_runs if key not in checkpoint.finished]
+            runs_to_do = len(runs)
+
+        pbar = stack.enter_context(
+            tqdm(
+                total=total_runs,
+                initial=total_runs - runs_to_do,
+                disable=not display_progress,
+            )
+        )
+        if number_processes == 1 and pool is None:
+            finished_runs = ([(run, process_func(run))] for run in runs)
+        else:
+            if pool is None:
+                pool = stack.enter_context(Pool(number_processes))
+            finished_runs = _run_chunked(
+                pool,
+                process_func,
+                runs,
+                runs_to_do,
+                number_processes or cpu_count(),
+                chunksize,
+            )
+
+        for chunk_results in finished_runs:
+            for run, data in chunk_results:
+                if checkpoint is not None:
+                    checkpoint.record(run_key(run), run, data)
                 pbar.update()
+                yield data
+
+
+def batch_run_to_file(
+    model_cls: Type[Model],
+    parameters: Mapping[str, Union[Any, Iterable[Any]]],
+    path: str,
+    file_format: Optional[str] = None,
+    buffer_rows: int = 100_000,
+    **kwargs: Any,
+) -> int:
+    """Batch run a mesa model and stream the rows to a file instead of
+    returning them, so memory use stays bounded however large the sweep is.
+
+    Rows are buffered and written every `buffer_rows` rows: as chunks
+    appended to a CSV file, as row groups of a Parquet file, or as record
+    batches of an Arrow IPC stream. Every chunk has the same columns, those
+    of the parameters and of the reporters of the data collector, which are
+    read from a model built with the first parameter combination; a value
+    missing from a row is left empty. In the columnar formats, every model
+    parameter whose values are hashable and of one type is
+    dictionary-encoded against the list of its values in `parameters`, so a
+    value is stored once instead of once per row. Parquet and Arrow need the
+    optional `pyarrow` package.
+
+    Parameters
+    ----------
+    model_cls : Type[Model]
+        The model class to batch-run
+    parameters : Mapping[str, Union[Any, Iterable[Any]]],
+        Dictionary with model parameters over which to run the model, see `batch_run`.
+    path : str
+        File to write to; it is overwritten.
+    file_format : str, optional
+        "csv", "parquet" or "arrow"; by default taken from the extension of
+        `path` (.csv, .parquet, .arrow or .arrows).
+    buffer_rows : int, optional
+        Number of rows to buffer before writing them, by default 100000
+    **kwargs
+        The other arguments of `batch_run`, e.g. number_processes, iterations
+        or max_steps.
+
+    Returns
+    -------
+    int
+        Number of rows written
+    """
+    if file_format is None:
+        extension = os.path.splitext(path)[1].lower()
+        file_format = {".arrows": "arrow"}.get(extension, extension.lstrip("."))
+    if file_format not in _WRITERS:
+        raise ValueError(
+            f"Unknown file format {file_format!r}, use one of {sorted(_WRITERS)}"
+        )
+    categories = _parameter_categories(parameters) if file_format != "csv" else {}
+    columns = _output_columns(model_cls, parameters)
+    writer = _WRITERS[file_format](path)
+    buffer: List[Dict[str, Any]] = []
+    rows_written = 0
+    try:
+        for data in iter_batch_run(model_cls, parameters, **kwargs):
+            buffer.extend(data)
+            if len(buffer) >= buffer_rows:
+                writer.write(_rows_to_frame(buffer, categories, columns))
+                rows_written += len(buffer)
+                buffer = []
+        if buffer or not rows_written:
+            writer.write(_rows_to_frame(buffer, categories, columns))
+            rows_written += len(buffer)
+    finally:
+        writer.close()
+    return rows_written
+
+
+def _parameter_categories(
+    parameters: Mapping[str, Union[Any, Iterable[Any]]]
+) -> Dict[str, List[Any]]:
+    """Returns, per parameter that can be dictionary-encoded, its values."""
+    values: Dict[str, List[Any]] = {}
+    for kwargs in _make_model_kwargs(parameters):
+        for param, value in kwargs.items():
+            values.setdefault(param, []).append(value)
+    categories = {}
+    for param, param_values in values.items():
+        try:
+            unique = list(dict.fromkeys(param_values))
+        except TypeError:
+            continue  # unhashable values
+        if None in unique or len({type(value) for value in unique}) > 1:
+            continue
+        categories[param] = unique
+    return categories
+
+
+def _output_columns(
+    model_cls: Type[Model], parameters: Mapping[str, Union[Any, Iterable[Any]]]
+) -> List[str]:
+    """Returns the columns of the rows of a batch run, in the order of the
+    rows, from the data collector of a model built with the first parameter
+    combination."""
+    kwargs = _make_model_kwargs(parameters)[0]
+    model = model_cls(**kwargs)
+    dc = model.datacollector
+    columns = ["RunId", "iteration", "Step", *kwargs, *dc.model_reporters]
+    if dc.agent_reporters:
+        columns += ["AgentID", *dc.agent_reporters]
+    close = getattr(model, "close", None)
+    if callable(close):
+        close()
+    return list(dict.fromkeys(columns))
+
+
+def _rows_to_frame(
+    rows: List[Dict[str, Any]],
+    categories: Dict[str, List[Any]],
+    columns: List[str],
+) -> pd.DataFrame:
+    """Turn rows into a DataFrame with the given columns, the parameter
+    columns as categoricals. Missing columns are filled with None."""
+    df = pd.DataFrame(rows)
+    for column in columns:
+        if column not in df:
+            df[column] = pd.Series([None] * len(df), index=df.index, dtype=object)
+    df = df[columns]
+    for param, values in categories.items():
+        if param in df:
+            df[param] = pd.Categorical(df[param], categories=values)
+    return df
+
+
+class _CsvWriter:
+    """Appends DataFrames to a CSV file, writing the header once."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._header = True
+
+    def write(self, df: pd.DataFrame) -> None:
+        df.to_csv(
+            self.path,
+            mode="w" if self._header else "a",
+            header=self._header,
+            index=False,
+        )
+        self._header = False
+
+    def close(self) -> None:
+        pass
+
+
+class _ArrowWriter:
+    """Writes DataFrames as row groups of a Parquet file or as record batches
+    of an Arrow IPC stream.
+
+    The schema is taken from the first DataFrames. As long as a column only
+    holds None, e.g. the agent columns of runs without agents, its type is
+    unknown, so the DataFrames are held back until every column has a type,
+    or until the writer is closed.
+    """
+
+    def __init__(self, path: str, file_format: str) -> None:
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError(
+                f"Writing {file_format} files requires pyarrow: pip install pyarrow"
+            )
+        self.path = path
+        self.file_format = file_format
+        self._pyarrow = pyarrow
+        self._writer = None
+        self._schema = None
+        self._pending = []
+
+    def write(self, df: pd.DataFrame) -> None:
+        table = self._pyarrow.Table.from_pandas(
+            df, schema=self._schema, preserve_index=False
+        )
+        if self._writer is not None:
+            self._writer.write_table(table)
+            return
+        self._pending.append(table)
+        schema = self._pyarrow.unify_schemas([table.schema for table in self._pending])
+        if not any(self._pyarrow.types.is_null(field.type) for field in schema):
+            self._open(schema)
+
+    def _open(self, schema) -> None:
+        """Open the file with `schema` and write the held back tables."""
+        self._schema = schema
+        if self.file_format == "parquet":
+            import pyarrow.parquet
+
+            self._writer = pyarrow.parquet.ParquetWriter(self.path, schema)
         else:
-            with Pool(number_processes) as p:
-                for data in p.imap_unordered(process_func, runs_list):
-                    results.extend(data)
-                    pbar.update()
+            self._writer = self._pyarrow.ipc.new_stream(self.path, schema)
+        for table in self._pending:
+            self._writer.write_table(table.cast(schema))
+        self._pending = []
+
+    def close(self) -> None:
+        if self._writer is None and self._pending:
+            self._open(
+                self._pyarrow.unify_schemas([table.schema for table in self._pending])
+            )
+        if self._writer is not None:
+            self._writer.close()
+
+
+_WRITERS: Dict[str, Callable[[str], Any]] = {
+    "csv": _CsvWriter,
+    "parquet": partial(_ArrowWriter, file_format="parquet"),
+    "arrow": partial(_ArrowWriter, file_format="arrow"),
+}
+
+
+# Target duration of a chunk of runs when the chunk size adapts
+_CHUNK_SECONDS = 0.5
+
+
+def _run_chunk(
+    process_func: Callable[[Tuple[int, int, Dict[str, Any]]], List[Dict[str, Any]]],
+    chunk: List[Tuple[int, int, Dict[str, Any]]],
+) -> Tuple[List[List[Dict[str, Any]]], float]:
+    """Run a chunk of runs in a worker; returns the data of each run and the
+    time taken."""
+    start = time.perf_counter()
+    data = [process_func(run) for run in chunk]
+    return data, time.perf_counter() - start
+
+
+def _run_chunked(
+    pool: Pool,
+    process_func: Callable[[Tuple[int, int, Dict[str, Any]]], List[Dict[str, Any]]],
+    runs: Iterable[Tuple[int, int, Dict[str, Any]]],
+    total_runs: int,
+    processes: int,
+    chunksize: Optional[int] = None,
+) -> Iterator[List[Tuple[Tuple[int, int, Dict[str, Any]], List[Dict[str, Any]]]]]:
+    """Run the runs on the pool in chunks and yield the (run, data) pairs of
+    each chunk as soon as it is done.
+
+    Up to two chunks per process are in flight, so workers never wait for the
+    next chunk. Without a fixed `chunksize`, the first chunks hold a single
+    run; after that the size is `_CHUNK_SECONDS` divided by the mean run
+    duration measured so far, capped so that the remaining runs still spread
+    over at least two chunks per process.
+    """
+    runs = iter(runs)
+    finished: "queue.Queue[Tuple[bool, Any, list]]" = queue.Queue()
+    in_flight = 0
+    dispatched = 0
+    seconds_run = 0.0
+    runs_timed = 0
+
+    while True:
+        while in_flight < 2 * processes:
+            if chunksize is not None:
+                size = chunksize
+            else:
+                size = 1
+                if runs_timed:
+                    size = max(
+                        1, int(_CHUNK_SECONDS * runs_timed / max(seconds_run, 1e-9))
+                    )
+                size = min(size, max(1, (total_runs - dispatched) // (2 * processes)))
+            chunk = list(itertools.islice(runs, size))
+            if not chunk:
+                break
+            pool.apply_async(
+                _run_chunk,
+                (process_func, chunk),
+                callback=lambda result, chunk=chunk: finished.put(
+                    (True, result, chunk)
+                ),
+                error_callback=lambda error, chunk=chunk: finished.put(
+                    (False, error, chunk)
+                ),
+            )
+            in_flight += 1
+            dispatched += len(chunk)
+        if not in_flight:
+            return
+        succeeded, result, chunk = finished.get()
+        in_flight -= 1
+        if not succeeded:
+            raise result
+        data, elapsed = result
+        seconds_run += elapsed
+        runs_timed += len(chunk)
+        yield list(zip(chunk, data))
+
+
+def _run_key(
+    model_cls: Type[Model],
+    run: Tuple[int, int, Dict[str, Any]],
+    max_steps: int,
+    data_collection_period: int,
+    collection_schedule: Optional[Union[int, str, Tuple[int, ...]]] = None,
+) -> str:
+    """Hash identifying a run of a sweep in a checkpoint manifest."""
+    run_id, iteration, kwargs = run
+    description = (
+        f"{model_cls.__module__}.{model_cls.__qualname__}",
+        _class_config(model_cls),
+        max_steps,
+        data_collection_period,
+        run_id,
+        iteration,
+        sorted(kwargs.items()),
+    )
+    if collection_schedule is not None:
+        description += (collection_schedule,)
+    return hashlib.sha256(repr(description).encode()).hexdigest()
 
-    return results
+
+class _SweepCheckpoint:
+    """Record of the finished runs of a sweep in a directory.
+
+    `results.pickle` holds one pickled (key, rows) record per finished run,
+    and `manifest.jsonl` one line per finished run with its key, RunId,
+    iteration and kwargs. A run counts as finished once its manifest line is
+    written, which happens after its rows are flushed to disk. Records cut
+    off by a crash are dropped when the checkpoint is opened again.
+    """
+
+    def __init__(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.results_path = os.path.join(directory, "results.pickle")
+        self.manifest_path = os.path.join(directory, "manifest.jsonl")
+        self.finished = set()
+        valid_end = 0
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "rb") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    if not line.endswith(b"\n"):
+                        break
+                    self.finished.add(entry["key"])
+                    valid_end += len(line)
+            _truncate(self.manifest_path, valid_end)
+        self._results = None
+        self._manifest = None
+
+    def __enter__(self) -> "_SweepCheckpoint":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        for f in (self._results, self._manifest):
+            if f is not None:
+                f.close()
+
+    def stored_results(self, keys: set) -> Iterator[List[Dict[str, Any]]]:
+        """Yield the rows of the finished runs whose key is in `keys`, and
+        drop records of runs that are not in the manifest."""
+        valid_end = 0
+        stored = set()
+        if os.path.exists(self.results_path):
+            with open(self.results_path, "rb") as f:
+                while True:
+                    try:
+                        key, data = pickle.load(f)
+                    except Exception:
+                        break
+                    if key not in self.finished:
+                        break
+                    valid_end = f.tell()
+                    stored.add(key)
+                    if key in keys:
+                        yield data
+            _truncate(self.results_path, valid_end)
+        # Manifest entries without rows cannot be resumed; run them again.
+        self.finished &= stored
+
+    def record(
+        self, key: str, run: Tuple[int, int, Dict[str, Any]], data: List[Dict[str, Any]]
+    ) -> None:
+        """Store the rows of a finished run, then mark it as finished."""
+        if self._results is None:
+            self._results = open(self.results_path, "ab")
+            self._manifest = open(self.manifest_path, "a")
+        pickle.dump((key, data), self._results)
+        self._results.flush()
+        os.fsync(self._results.fileno())
+        run_id, iteration, kwargs = run
+        entry = {
+            "key": key,
+            "RunId": run_id,
+            "iteration": iteration,
+            "kwargs": repr(kwargs),
+        }
+        self._manifest.write(json.dumps(entry) + "\n")
+        self._manifest.flush()
+        os.fsync(self._manifest.fileno())
+        self.finished.add(key)
+
+
+def _truncate(path: str, size: int) -> None:
+    """Cut a file to its first `size` bytes, if it is longer."""
+    if os.path.getsize(path) > size:
+        with open(path, "r+b") as f:
+            f.truncate(size)
 
 
 def _make_model_kwargs(
@@ -131,6 +685,8 @@ def _model_run_func(
     run: Tuple[int, int, Dict[str, Any]],
     max_steps: int,
     data_collection_period: int,
+    cache: Optional["_ResultCache"] = None,
+    collection_schedule: Optional[Union[int, str, Tuple[int, ...]]] = None,
 ) -> List[Dict[str, Any]]:
     """Run a single model run and collect model and agent data.
 
@@ -144,6 +700,10 @@ def _model_run_func(
         Maximum number of model steps after which the model halts, by default 1000
     data_collection_period : int
         Number of steps after which data gets collected
+    cache : _ResultCache, optional
+        Cache to take the data from, or to store it in, if the run is seeded
+    collection_schedule : Union[int, str, Tuple[int, ...]], optional
+        Collection schedule for the data collector of the model
 
     Returns
     -------
@@ -151,19 +711,41 @@ def _model_run_func(
         Return model_data, agent_data from the reporters
     """
     run_id, iteration, kwargs = run
+    cache_key = None
+    if cache is not None and kwargs.get("seed") is not None:
+        cache_key = cache.key(
+            model_cls, kwargs, max_steps, data_collection_period, collection_schedule
+        )
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return [{**row, "RunId": run_id, "iteration": iteration} for row in cached]
+
     model = model_cls(**kwargs)
+    dc = model.datacollector
+    if collection_schedule is not None:
+        dc.set_collection_schedule(collection_schedule)
     while model.running and model.schedule.steps <= max_steps:
         model.step()
 
     data = []
 
-    steps = list(range(0, model.schedule.steps, data_collection_period))
-    if not steps or steps[-1] != model.schedule.steps - 1:
-        steps.append(model.schedule.steps - 1)
-
-    for step in steps:
-        model_data, all_agents_data = _collect_data(model, step)
-
+    if collection_schedule is None:
+        steps = list(range(0, model.schedule.steps, data_collection_period))
+        if not steps or steps[-1] != model.schedule.steps - 1:
+            steps.append(model.schedule.steps - 1)
+        collections = [(step, step) for step in steps]
+    else:
+        # The collection at construction precedes the schedule, keep it only
+        # if the schedule includes step 0
+        dc.collect_final(model)
+        last = len(dc.collected_steps) - 1
+        collections = [
+            (index, step)
+            for index, step in enumerate(dc.collected_steps)
+            if index == last or dc.is_collection_step(step)
+        ]
+
+    for step, model_data, all_agents_data in _collect_data(model, collections):
         # If there are agent_reporters, then create an entry for each agent
         if all_agents_data:
             stepdata = [
@@ -190,25 +772,195 @@ def _model_run_func(
             ]
         data.extend(stepdata)
 
+    # Models that hold resources, such as worker processes or open files,
+    # release them in close()
+    close = getattr(model, "close", None)
+    if callable(close):
+        close()
+
+    if cache_key is not None:
+        cache.put(cache_key, data)
     return data
 
 
+@lru_cache(maxsize=None)
+def _source_hash(model_cls: Type[Model]) -> str:
+    """Hash of the source files of the package (or module) defining a model."""
+    package_name = model_cls.__module__.split(".")[0]
+    package = importlib.import_module(package_name)
+    paths = []
+    if hasattr(package, "__path__"):
+        for directory in package.__path__:
+            for root, _, files in os.walk(directory):
+                paths.extend(
+                    os.path.join(root, name) for name in files if name.endswith(".py")
+                )
+    else:
+        paths.append(inspect.getsourcefile(package))
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _class_config(model_cls: Type[Model]) -> List[Tuple[str, str]]:
+    """The configuration of a model class held in class attributes, as sorted
+    (name, repr) pairs: every attribute of the class and its bases that is
+    neither a dunder nor callable, nor a static method, class method or
+    property. It is read afresh on every call, since it can be changed
+    between sweeps."""
+    config: Dict[str, str] = {}
+    for klass in model_cls.__mro__:
+        for name, value in vars(klass).items():
+            if (
+                name in config
+                or (name.startswith("__") and name.endswith("__"))
+                or callable(value)
+                or isinstance(value, (staticmethod, classmethod, property))
+            ):
+                continue
+            config[name] = repr(value)
+    return sorted(config.items())
+
+
+class _ResultCache:
+    """Content-addressed cache of run data on local disk.
+
+    Every entry is a pickle file, named after its key, of the rows of a run;
+    their RunId and iteration are replaced by those of the run on a hit,
+    since the key does not depend on them. The key covers the configuration
+    held in class attributes of the model, see `_class_config`. Reading an
+    entry marks it as recently used, and whenever the directory grows past
+    `max_bytes` the least recently used entries are deleted. Several
+    processes can share a cache directory.
+
+    The size of the directory is scanned on the first put, and then kept as a
+    running total of the entries this cache puts; the directory is only
+    scanned again once that total exceeds `max_bytes`, so entries other
+    processes put are counted from then on. Eviction deletes entries down to
+    90% of `max_bytes`, so a full cache is not rescanned on every put.
+    """
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._total_bytes: Optional[int] = None
+
+    def key(
+        self,
+        model_cls: Type[Model],
+        kwargs: Dict[str, Any],
+        max_steps: int,
+        data_collection_period: int,
+        collection_schedule: Optional[Union[int, str, Tuple[int, ...]]] = None,
+    ) -> str:
+        description = (
+            f"{model_cls.__module__}.{model_cls.__qualname__}",
+            _source_hash(model_cls),
+            _class_config(model_cls),
+            sorted(kwargs.items()),
+            max_steps,
+            data_collection_period,
+        )
+        if collection_schedule is not None:
+            description += (collection_schedule,)
+        return hashlib.sha256(repr(description).encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".pickle")
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+            os.utime(path)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        return data
+
+    def put(self, key: str, data: List[Dict[str, Any]]) -> None:
+        path = self._path(key)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        # Write to a temporary file first, so readers never see partial entries
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            size = f.tell()
+        os.replace(temporary, path)
+        if self._total_bytes is None:
+            self._evict()
+            return
+        self._total_bytes += size - replaced
+        if self._total_bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self) -> None:
+        """Scan the directory and, if it is larger than `max_bytes`, delete
+        the least recently used entries down to 90% of `max_bytes`."""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pickle"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        if total > self.max_bytes:
+            target = self.max_bytes * 0.9
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                if total <= target:
+                    break
+        self._total_bytes = total
+
+
 def _collect_data(
     model: Model,
-    step: int,
-) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
-    """Collect model and agent data from a model using mesas datacollector."""
+    collections: List[Tuple[int, int]],
+) -> Iterator[Tuple[int, Dict[str, Any], List[Dict[str, Any]]]]:
+    """Collect model and agent data from a model using mesas datacollector.
+
+    `collections` holds the (index, step) pairs to collect: the position of
+    the collection in the model variables and the step of its agent
+    records. Yields the step, model data and agent data of each pair. Data
+    spilled to disk is read back one spill at a time, keeping only the
+    collections asked for.
+    """
     dc = model.datacollector
-
-    model_data = {param: values[step] for param, values in dc.model_vars.items()}
-
-    all_agents_data = []
-    raw_agent_data = dc._agent_records.get(step, [])
-    for data in raw_agent_data:
-        agent_dict = {"AgentID": data[1]}
-        agent_dict.update(zip(dc.agent_reporters, data[2:]))
-        all_agents_data.append(agent_dict)
-    return model_data, all_agents_data
+    indexes = {index for index, _ in collections}
+    steps = {step for _, step in collections}
+    model_values = {}
+    agent_records = {}
+    for index, step, values, records in dc._iter_collections():
+        if index in indexes:
+            model_values[index] = values
+        if step in steps and records is not None:
+            agent_records[step] = records
+
+    for index, step in collections:
+        model_data = dict(zip(dc.model_vars, model_values[index]))
+
+        all_agents_data = []
+        raw_agent_data = agent_records.get(step)
+        if raw_agent_data is not None:
+            columns = [array.tolist() for array in raw_agent_data]
+            for data in zip(*columns):
+                agent_dict = {"AgentID": data[0]}
+                agent_dict.update(zip(dc.agent_reporters, data[1:]))
+                all_agents_data.append(agent_dict)
+        yield step, model_data, all_agents_data
 
 
 class ParameterError(TypeError):
@@ -21,11 +21,35 @@ Additionally, other objects can write directly to tables by passing in an
 appropriate dictionary object for a table row.
 
 The DataCollector then stores the data it collects in dictionaries:
-    * model_vars maps each reporter to a list of its values
+    * model_vars maps each reporter to a sequence of its values, stored in a
+      growable NumPy buffer whose dtype is inferred from the values
     * tables maps each table to a dictionary, with each column as a key with a
       list as its value.
-    * _agent_records maps each model step to a list of each agents id
-      and its values.
+    * _agent_records maps each model step to a tuple of NumPy arrays: the
+      ids of the agents, then the values of each agent reporter. With
+      `agent_keyframe_every`, only every so many steps hold such a full
+      keyframe; the others hold the changes since the previous collection.
+
+By default every call to collect() collects. A collection schedule, given
+to the constructor or to set_collection_schedule(), restricts collection to
+some steps of the model schedule: every k steps, the steps from an iterable
+such as log_spaced_steps(), or only the final step, collected by
+collect_final(). Calls on other steps return without evaluating any reporter.
+
+Agent records can be delta-encoded: with `agent_keyframe_every=k`, every
+k-th collection stores the full agent records, and the others only the
+agents that died, the agents that were born and the values that changed
+since the previous collection. get_agent_vars_at() rebuilds the records of
+any step on demand.
+
+A DataCollector with a spill directory bounds its memory use for long
+runs: every `spill_every` collections it appends the model variables, agent
+records and table rows collected since the last spill to the directory,
+and keeps only the last `memory_window` collections (and table rows) in
+memory, e.g. for live charts. The get_*_dataframe() methods read the
+spilled history back, and iter_model_vars_dataframes() and
+iter_agent_vars_dataframes() read it one spill at a time. remove_spill()
+deletes the spill directory once the data is no longer needed.
 
 Finally, DataCollector can create a pandas DataFrame from each collection.
 
@@ -34,13 +58,361 @@ The default DataCollector here makes several assumptions:
     * The schedule has an agent list called agents
     * For collecting agent-level variables, agents must have a unique_id
 """
+from collections.abc import Sequence
 from functools import partial
 import itertools
 from operator import attrgetter
+import os
+import shutil
+import tempfile
+import numpy as np
 import pandas as pd
 import types
 
 
+def log_spaced_steps(last_step, count):
+    """Return about `count` steps from 0 to `last_step`, evenly spaced on a
+    log scale, for a collection schedule that samples early dynamics densely
+    and long runs sparsely. Steps that coincide at the start are merged, so
+    fewer than `count` steps can be returned.
+    """
+    steps = np.rint(np.geomspace(1, last_step + 1, count)).astype(int) - 1
+    return np.unique(steps).tolist()
+
+
+def _every(period, step):
+    return step % period == 0
+
+
+def _never(step):
+    return False
+
+
+def _call_with_args(function, args, model):
+    return function(*args)
+
+
+def _call_without_model(function, model):
+    return function()
+
+
+def _dtype_of(value_type):
+    """dtype of a buffer for values of the given type: bool, int64 or float64
+    for Python and NumPy scalars, object for anything else."""
+    if issubclass(value_type, np.generic):
+        dtype = np.dtype(value_type)
+        return dtype if dtype.kind in "biuf" else _OBJECT
+    return _DTYPES.get(value_type, _OBJECT)
+
+
+def _promote(dtype, other):
+    """dtype that holds values of both dtypes; numbers are widened, any other
+    mix gives object."""
+    if dtype is None or dtype == other:
+        return other
+    if dtype.kind in "iuf" and other.kind in "iuf":
+        return np.result_type(dtype, other)
+    return _OBJECT
+
+
+_OBJECT = np.dtype(object)
+_DTYPES = {bool: np.dtype(bool), int: np.dtype(np.int64), float: np.dtype(np.float64)}
+# Number of collections after which model values are moved into the buffers
+_FLUSH_EVERY = 256
+
+
+def _to_array(values):
+    """Convert a list of values into an array of the dtype _Column would
+    store them in."""
+    dtype = None
+    for value_type in set(map(type, values)):
+        dtype = _promote(dtype, _dtype_of(value_type))
+    if dtype is None or dtype == _OBJECT:
+        # fromiter does not unpack sequences, e.g. positions, like array does
+        return np.fromiter(values, dtype=_OBJECT, count=len(values))
+    try:
+        return np.array(values, dtype=dtype)
+    except OverflowError:
+        return np.fromiter(values, dtype=_OBJECT, count=len(values))
+
+
+def _concatenate(arrays):
+    """Concatenate arrays, promoting their dtypes like _Column does."""
+    if len(arrays) == 1:
+        return arrays[0]
+    dtype = None
+    for array in arrays:
+        if len(array):
+            dtype = _promote(dtype, array.dtype)
+    if dtype is None or dtype == _OBJECT:
+        values = itertools.chain.from_iterable(array.tolist() for array in arrays)
+        return np.fromiter(values, dtype=_OBJECT, count=sum(map(len, arrays)))
+    # Empty arrays, e.g. the object array of a collection without agents,
+    # need not cast to the dtype
+    return np.concatenate([array for array in arrays if len(array)], dtype=dtype)
+
+
+def _split_by_step(steps, columns):
+    """Split per agent and collection arrays, sorted by step, into a list
+    of (step, records) pairs, the records being a tuple of the arrays of
+    that step."""
+    if not len(steps):
+        return []
+    bounds = np.flatnonzero(np.diff(steps)) + 1
+    parts = [np.split(values, bounds) for values in columns]
+    return list(zip(steps[np.r_[0, bounds]].tolist(), zip(*parts)))
+
+
+def _as_dtype(array, dtype):
+    """Convert an array to a dtype; to object with Python scalars."""
+    if array.dtype == dtype:
+        return array
+    if dtype == _OBJECT:
+        return np.fromiter(array.tolist(), dtype=_OBJECT, count=len(array))
+    return array.astype(dtype)
+
+
+class _AgentDelta:
+    """Agent records of a collection as the changes since the previous one.
+
+    Properties:
+        died: Positions, in the previous records, of the agents that are
+              gone.
+        born: Ids and values of each reporter of the agents that were
+              added, which come after the others.
+        changed: Per reporter, None if no value changed, else a tuple of the
+                 positions of the agents whose value changed and their new
+                 values, or of None and the values of all agents that were
+                 there before.
+    """
+
+    __slots__ = ("died", "born", "changed")
+
+    def __init__(self, died, born, changed):
+        self.died = died
+        self.born = born
+        self.changed = changed
+
+    @classmethod
+    def encode(cls, previous, current):
+        """Return the changes from the records `previous` to `current`, or
+        None if `current` does not follow from `previous` by removing agents
+        and appending new ones, e.g. if the agents were reordered."""
+        previous_ids, ids = previous[0], current[0]
+        if previous_ids.dtype == _OBJECT or ids.dtype == _OBJECT:
+            return None
+        alive = np.isin(previous_ids, ids)
+        stayed = int(np.count_nonzero(alive))
+        if (
+            not np.array_equal(previous_ids[alive], ids[:stayed])
+            or np.isin(ids[stayed:], previous_ids).any()
+        ):
+            return None
+
+        changed = []
+        for before, after in zip(previous[1:], current[1:]):
+            before, after = before[alive], after[:stayed]
+            differs = None
+            if before.dtype == after.dtype:
+                try:
+                    differs = np.asarray(before != after, dtype=bool)
+                except (TypeError, ValueError):
+                    pass
+            if differs is None or differs.shape != (stayed,):
+                changed.append((None, after.copy()))
+                continue
+            positions = np.flatnonzero(differs)
+            if not len(positions):
+                changed.append(None)
+            elif 2 * len(positions) > stayed:
+                # Positions would take more space than they save
+                changed.append((None, after.copy()))
+            else:
+                changed.append((positions, after[positions]))
+        born = tuple(column[stayed:].copy() for column in current)
+        return cls(np.flatnonzero(~alive), born, changed)
+
+    def apply(self, previous):
+        """Return the records that follow from `previous` by the changes."""
+        current = [_concatenate([np.delete(previous[0], self.died), self.born[0]])]
+        for before, born, changed in zip(previous[1:], self.born[1:], self.changed):
+            values = np.delete(before, self.died)
+            if changed is not None:
+                positions, new_values = changed
+                if positions is None:
+                    values = new_values
+                else:
+                    values = _as_dtype(values, _promote(values.dtype, new_values.dtype))
+                    values[positions] = new_values
+            current.append(_concatenate([values, born]))
+        return tuple(current)
+
+
+class _SpillStore:
+    """Append-only store of the data a DataCollector spilled to a directory.
+
+    Every spill is one NumPy .npz file, chunk-000000.npz, chunk-000001.npz,
+    ..., holding the arrays:
+        * model_steps and model_<i>: the step of each collection and the
+          values of the i-th model reporter;
+        * agent_steps, agent_ids and agent_<i>: per agent and collection,
+          the step, the agent id and the value of the i-th agent reporter;
+        * table_<i>_<j>: the rows of column j of the i-th table.
+    A chunk is written to a temporary file and renamed, so readers never
+    see a partial chunk. Chunks are read one at a time, and an array only
+    when it is accessed.
+    """
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        if any(name.startswith("chunk-") for name in os.listdir(directory)):
+            raise Exception(
+                "Spill directory {} already holds spilled data.".format(directory)
+            )
+        self.directory = directory
+        self.chunks = 0
+
+    def _path(self, chunk):
+        return os.path.join(self.directory, "chunk-{:06d}.npz".format(chunk))
+
+    def write(self, arrays):
+        fd, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(temporary, self._path(self.chunks))
+        self.chunks += 1
+
+    def __iter__(self):
+        for chunk in range(self.chunks):
+            # Object arrays are pickled; the chunks are our own files
+            with np.load(self._path(chunk), allow_pickle=True) as arrays:
+                yield arrays
+
+
+class _Column(Sequence):
+    """The values of one model reporter, in a NumPy buffer that grows
+    geometrically.
+
+    Values are appended to a short Python list, `append` being that list's
+    own method, and moved into the buffer in blocks by `flush()`. The dtype
+    follows the values: bool, int64 or float64 for Python and NumPy scalars,
+    object otherwise. Numbers of different types are widened (e.g. int64 to
+    float64) and any other mix gives object. Indexing returns Python
+    objects, like the list the column replaces; to_numpy() returns a view.
+
+    A spilling DataCollector drops the oldest values with `trim()`. The
+    positions of the values kept do not change. Reading dropped values, by
+    index, slice or iteration, reads them back from the spilled chunks
+    through `spilled`, a function returning the spilled values, which is
+    slow.
+    """
+
+    __slots__ = ("_data", "_size", "_offset", "_staged", "append", "spilled")
+
+    def __init__(self):
+        self._data = np.empty(0, dtype=_OBJECT)
+        self._size = 0
+        # Number of values dropped from the start by trim()
+        self._offset = 0
+        self._staged = []
+        self.append = self._staged.append
+        self.spilled = None
+
+    def flush(self):
+        """Move the appended values into the buffer."""
+        staged = self._staged
+        if not staged:
+            return
+        dtype = self._data.dtype if self._size else None
+        for value_type in set(map(type, staged)):
+            dtype = _promote(dtype, _dtype_of(value_type))
+        if dtype != self._data.dtype:
+            self._set_dtype(dtype)
+        end = self._size + len(staged)
+        if end > len(self._data):
+            self._resize(max(64, 2 * len(self._data), end))
+        try:
+            self._data[self._size : end] = staged
+        except OverflowError:
+            # An int beyond int64
+            self._set_dtype(_OBJECT)
+            self._data[self._size : end] = staged
+        self._size = end
+        staged.clear()
+
+    def _set_dtype(self, dtype):
+        if dtype == _OBJECT:
+            data = np.empty(len(self._data), dtype=_OBJECT)
+            # Keep Python scalars, as astype would give NumPy ones
+            data[: self._size] = self._data[: self._size].tolist()
+            self._data = data
+        else:
+            self._data = self._data.astype(dtype)
+
+    def _resize(self, capacity):
+        data = np.empty(capacity, dtype=self._data.dtype)
+        data[: self._size] = self._data[: self._size]
+        self._data = data
+
+    def tail(self, start):
+        """Return a view of the values from position `start` on, which must
+        not have been dropped."""
+        return self.to_numpy()[start - self._offset :]
+
+    def trim(self, keep):
+        """Drop all but the last `keep` values from memory."""
+        self.flush()
+        drop = self._size - keep
+        if drop > 0:
+            self._data[:keep] = self._data[drop : self._size]
+            self._size = keep
+            self._offset += drop
+
+    def load(self, values):
+        """Replace the values by the array `values`, as positions 0 on."""
+        self._staged.clear()
+        self._data = values.copy()
+        self._size = len(values)
+        self._offset = 0
+        self.spilled = None
+
+    def to_numpy(self):
+        """Return a view of the values in memory; it is not updated by later
+        appends."""
+        self.flush()
+        return self._data[: self._size]
+
+    def _all_values(self):
+        """Return all values, reading the dropped ones from the spill."""
+        if not self._offset:
+            return self.to_numpy()
+        return _concatenate([self.spilled()[: self._offset], self.to_numpy()])
+
+    def __len__(self):
+        return self._offset + self._size + len(self._staged)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            positions = np.arange(len(self))[index] - self._offset
+            if len(positions) and positions.min() < 0:
+                return self._all_values()[index].tolist()
+            return self.to_numpy()[positions].tolist()
+        self.flush()
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("column index out of range")
+        if index < self._offset:
+            return self.spilled()[index].item()
+        return self._data.item(index - self._offset)
+
+    def __iter__(self):
+        return iter(self._all_values().tolist())
+
+    def __repr__(self):
+        return repr(self.to_numpy().tolist())
+
+
 class DataCollector:
     """Class for collecting data generated by a Mesa model.
 
@@ -51,7 +423,17 @@ class DataCollector:
     one and stores the results.
     """
 
-    def __init__(self, model_reporters=None, agent_reporters=None, tables=None):
+    def __init__(
+        self,
+        model_reporters=None,
+        agent_reporters=None,
+        tables=None,
+        collection_schedule=None,
+        spill_dir=None,
+        spill_every=1000,
+        memory_window=100,
+        agent_keyframe_every=None,
+    ):
         """Instantiate a DataCollector with lists of model and agent reporters.
         Both model_reporters and agent_reporters accept a dictionary mapping a
         variable name to either an attribute name, or a method.
@@ -74,6 +456,20 @@ class DataCollector:
             model_reporters: Dictionary of reporter names and attributes/funcs
             agent_reporters: Dictionary of reporter names and attributes/funcs.
             tables: Dictionary of table names to lists of column names.
+            collection_schedule: Steps to collect at, see
+                                 set_collection_schedule(); by default
+                                 every call to collect() collects.
+            spill_dir: Directory to spill the collected data to, see
+                       spill(); by default everything is kept in memory.
+                       Every DataCollector needs a directory of its own.
+            spill_every: Number of collections after which the collected
+                         data is spilled.
+            memory_window: Number of the latest collections, and of table
+                           rows, kept in memory after a spill.
+            agent_keyframe_every: If given, the agent records of only every
+                                  so many collections are stored in full,
+                                  and those of the others as the changes
+                                  since the previous collection.
 
         Notes:
             If you want to pickle your model you must not use lambda functions.
@@ -92,10 +488,36 @@ class DataCollector:
         """
         self.model_reporters = {}
         self.agent_reporters = {}
+        # (append, report) per model reporter, see _new_model_reporter
+        self._model_collectors = []
 
         self.model_vars = {}
         self._agent_records = {}
         self.tables = {}
+        self.collected_steps = _Column()
+        self.set_collection_schedule(collection_schedule)
+
+        self.spill_dir = spill_dir
+        self._store = None
+        if spill_dir is not None:
+            if spill_every < 1 or memory_window < 1:
+                raise Exception("spill_every and memory_window must be at least 1.")
+            self._store = _SpillStore(spill_dir)
+        self.spill_every = spill_every
+        self.memory_window = memory_window
+        # What was spilled: the number of collections, the number of agent
+        # records and of table rows at the start of the ones in memory
+        self._spilled = 0
+        self._agent_records_spilled = 0
+        self._table_rows_spilled = {}
+
+        if agent_keyframe_every is not None and agent_keyframe_every < 1:
+            raise Exception("agent_keyframe_every must be at least 1.")
+        self.agent_keyframe_every = agent_keyframe_every
+        # Full agent records of the last collection, and the number of
+        # collections since the last keyframe
+        self._last_agent_records = None
+        self._since_keyframe = 0
 
         if model_reporters is not None:
             for name, reporter in model_reporters.items():
@@ -120,7 +542,16 @@ class DataCollector:
         if type(reporter) is str:
             reporter = partial(self._getattr, reporter)
         self.model_reporters[name] = reporter
-        self.model_vars[name] = []
+        self.model_vars[name] = _Column()
+
+        # Resolve the kind of reporter once, into a function of the model
+        if isinstance(reporter, (types.LambdaType, partial)):
+            report = reporter
+        elif isinstance(reporter, list):
+            report = partial(_call_with_args, reporter[0], reporter[1])
+        else:
+            report = partial(_call_without_model, reporter)
+        self._model_collectors.append((self.model_vars[name].append, report))
 
     def _new_agent_reporter(self, name, reporter):
         """Add a new agent-level reporter to collect.
@@ -145,47 +576,319 @@ class DataCollector:
         """
         new_table = {column: [] for column in table_columns}
         self.tables[table_name] = new_table
+        self._table_rows_spilled[table_name] = 0
 
     def _record_agents(self, model):
-        """Record agents data in a mapping of functions and agents."""
-        rep_funcs = self.agent_reporters.values()
-        if all(hasattr(rep, "attribute_name") for rep in rep_funcs):
-            prefix = ["model.schedule.steps", "unique_id"]
-            attributes = [func.attribute_name for func in rep_funcs]
-            get_reports = attrgetter(*prefix + attributes)
-        else:
+        """Record agents data as a tuple of arrays: the agent ids, then one
+        array per reporter, each typed like a model variable column."""
+        agents = model.schedule.agents
+        columns = [_to_array([agent.unique_id for agent in agents])]
+        for reporter in self.agent_reporters.values():
+            attribute_name = getattr(reporter, "attribute_name", None)
+            values = None
+            if attribute_name is not None:
+                try:
+                    values = list(map(attrgetter(attribute_name), agents))
+                except AttributeError:
+                    # Agents without the attribute report None
+                    pass
+            if values is None:
+                values = list(map(reporter, agents))
+            columns.append(_to_array(values))
+        return tuple(columns)
+
+    def set_collection_schedule(self, schedule):
+        """Set the steps of the model schedule at which collect() collects.
 
-            def get_reports(agent):
-                _prefix = (agent.model.schedule.steps, agent.unique_id)
-                reports = tuple(rep(agent) for rep in rep_funcs)
-                return _prefix + reports
-
-        agent_records = map(get_reports, model.schedule.agents)
-        return agent_records
+        Args:
+            schedule: None to collect on every call, an int k to collect
+                      every k steps (0, k, 2k, ...), "end" to only collect
+                      the final step through collect_final(), or an
+                      iterable of the steps to collect, e.g. from
+                      log_spaced_steps().
+        """
+        if schedule is None:
+            self._is_collection_step = None
+        elif isinstance(schedule, str):
+            if schedule != "end":
+                raise Exception("Unknown collection schedule: {}".format(schedule))
+            self._is_collection_step = _never
+        elif isinstance(schedule, int):
+            if schedule < 1:
+                raise Exception("The collection period must be at least 1.")
+            self._is_collection_step = partial(_every, schedule)
+        else:
+            self._is_collection_step = frozenset(schedule).__contains__
 
-    def _reporter_decorator(self, reporter):
-        return reporter()
+    def is_collection_step(self, step):
+        """Return True if collect() collects at the given step."""
+        return self._is_collection_step is None or self._is_collection_step(step)
 
     def collect(self, model):
-        """Collect all the data for the given model object."""
-        if self.model_reporters:
-
-            for var, reporter in self.model_reporters.items():
-                # Check if Lambda operator
-                if isinstance(reporter, types.LambdaType):
-                    self.model_vars[var].append(reporter(model))
-                # Check if model attribute
-                elif isinstance(reporter, partial):
-                    self.model_vars[var].append(reporter(model))
-                # Check if function with arguments
-                elif isinstance(reporter, list):
-                    self.model_vars[var].append(reporter[0](*reporter[1]))
-                else:
-                    self.model_vars[var].append(self._reporter_decorator(reporter))
+        """Collect all the data for the given model object, unless the
+        collection schedule skips the current step."""
+        step = model.schedule.steps
+        if self._is_collection_step is not None and not self._is_collection_step(step):
+            return
+        self._collect(model, step)
+
+    def collect_final(self, model):
+        """Collect the current step, when the model stops, if the collection
+        schedule skipped it."""
+        step = model.schedule.steps
+        if not len(self.collected_steps) or self.collected_steps[-1] != step:
+            self._collect(model, step)
+
+    def _collect(self, model, step):
+        collected_steps = self.collected_steps
+        collected_steps.append(step)
+        for append, report in self._model_collectors:
+            append(report(model))
+        if len(collected_steps._staged) >= _FLUSH_EVERY:
+            collected_steps.flush()
+            for column in self.model_vars.values():
+                column.flush()
 
         if self.agent_reporters:
-            agent_records = self._record_agents(model)
-            self._agent_records[model.schedule.steps] = list(agent_records)
+            records = self._record_agents(model)
+            self._agent_records[step] = self._encode_agent_records(step, records)
+            self._last_agent_records = records
+
+        if (
+            self._store is not None
+            and len(collected_steps) - self._spilled >= self.spill_every
+        ):
+            self.spill()
+
+    def _encode_agent_records(self, step, records):
+        """Return the records themselves as a keyframe, or their changes
+        since the last collection."""
+        if self.agent_keyframe_every is None:
+            return records
+        delta = None
+        if (
+            self._since_keyframe + 1 < self.agent_keyframe_every
+            and self._last_agent_records is not None
+            # A step collected twice replaces the records its delta is from
+            and step not in self._agent_records
+        ):
+            delta = _AgentDelta.encode(self._last_agent_records, records)
+        if delta is None:
+            self._since_keyframe = 0
+            return records
+        self._since_keyframe += 1
+        return delta
+
+    def _decoded_agent_records(self):
+        """Yield the step and full records of each agent collection in
+        memory; the first one is always a keyframe."""
+        records = None
+        for step, record in self._agent_records.items():
+            records = record if isinstance(record, tuple) else record.apply(records)
+            yield step, records
+
+    def _agent_record(self, step):
+        """Return the full agent records of a step in memory, or None."""
+        if step not in self._agent_records:
+            return None
+        steps = list(self._agent_records)
+        end = steps.index(step)
+        start = end
+        while not isinstance(self._agent_records[steps[start]], tuple):
+            start -= 1
+        records = self._agent_records[steps[start]]
+        for delta_step in steps[start + 1 : end + 1]:
+            records = self._agent_records[delta_step].apply(records)
+        return records
+
+    def spill(self):
+        """Append everything collected since the last spill to the spill
+        directory, and drop all but the last `memory_window` collections and
+        table rows from memory."""
+        if self._store is None:
+            raise Exception("The DataCollector has no spill directory.")
+        arrays = {}
+        steps, columns = self._model_in_memory()
+        arrays["model_steps"] = steps
+        for i, values in enumerate(columns):
+            arrays["model_{}".format(i)] = values
+        records = self._agent_records_in_memory()
+        if records is not None:
+            steps, ids, columns = records
+            arrays["agent_steps"] = steps
+            arrays["agent_ids"] = ids
+            for i, values in enumerate(columns):
+                arrays["agent_{}".format(i)] = values
+        for i, name in enumerate(self.tables):
+            for j, values in enumerate(self._table_in_memory(name)):
+                arrays["table_{}_{}".format(i, j)] = values
+        self._store.write(arrays)
+
+        window = self.memory_window
+        self._spilled = len(self.collected_steps)
+        self.collected_steps.trim(window)
+        self.collected_steps.spilled = partial(self._spilled_values, "model_steps")
+        for i, column in enumerate(self.model_vars.values()):
+            column.trim(window)
+            column.spilled = partial(self._spilled_values, "model_{}".format(i))
+        steps = list(self._agent_records)
+        if len(steps) > window:
+            # The first records kept become a keyframe
+            self._agent_records[steps[-window]] = self._agent_record(steps[-window])
+            for step in steps[:-window]:
+                del self._agent_records[step]
+        self._agent_records_spilled = len(self._agent_records)
+        for name, table in self.tables.items():
+            for values in table.values():
+                del values[:-window]
+            self._table_rows_spilled[name] = len(next(iter(table.values()), []))
+
+    def _spilled_values(self, key):
+        """All spilled values of a model variable, or of the steps."""
+        if self._store is None:
+            raise Exception("The spilled data was removed.")
+        return _concatenate([arrays[key] for arrays in self._store])
+
+    def _model_in_memory(self):
+        """Steps and model variable values that were not spilled yet."""
+        start = self._spilled
+        return (
+            self.collected_steps.tail(start),
+            [column.tail(start) for column in self.model_vars.values()],
+        )
+
+    def _agent_records_in_memory(self):
+        """Steps, agent ids and agent variable values, one entry per agent and
+        collection, that were not spilled yet; None if there are none."""
+        records = list(self._decoded_agent_records())[self._agent_records_spilled :]
+        if not records:
+            return None
+        steps = np.repeat(
+            np.array([step for step, _ in records], dtype=np.int64),
+            [len(chunk[0]) for _, chunk in records],
+        )
+        columns = [
+            _concatenate(arrays) for arrays in zip(*(chunk for _, chunk in records))
+        ]
+        return steps, columns[0], columns[1:]
+
+    def _table_in_memory(self, table_name):
+        """Columns of the table rows that were not spilled yet."""
+        start = self._table_rows_spilled[table_name]
+        return [
+            _to_array(values[start:]) for values in self.tables[table_name].values()
+        ]
+
+    def _model_chunks(self):
+        """Yield the steps and model variable values of each spill, then of
+        the collections not spilled yet."""
+        if self._store is not None:
+            names = range(len(self.model_vars))
+            for arrays in self._store:
+                yield (
+                    arrays["model_steps"],
+                    [arrays["model_{}".format(i)] for i in names],
+                )
+        yield self._model_in_memory()
+
+    def _agent_chunks(self):
+        """Yield the steps, agent ids and agent variable values of each spill,
+        then of the collections not spilled yet."""
+        if self._store is not None:
+            names = range(len(self.agent_reporters))
+            for arrays in self._store:
+                if "agent_ids" in arrays:
+                    yield (
+                        arrays["agent_steps"],
+                        arrays["agent_ids"],
+                        [arrays["agent_{}".format(i)] for i in names],
+                    )
+        records = self._agent_records_in_memory()
+        if records is not None:
+            yield records
+
+    def _iter_collections(self):
+        """Yield the position, step, model variable values and full agent
+        records (None if no agents were recorded) of every collection,
+        reading the spilled ones back one spill at a time."""
+        index = 0
+        names = range(len(self.model_vars))
+        agent_names = range(len(self.agent_reporters))
+        for arrays in self._store if self._store is not None else ():
+            records = {}
+            if "agent_ids" in arrays:
+                columns = [arrays["agent_ids"]]
+                columns += [arrays["agent_{}".format(i)] for i in agent_names]
+                records = dict(_split_by_step(arrays["agent_steps"], columns))
+            steps = arrays["model_steps"].tolist()
+            values = zip(*[arrays["model_{}".format(i)].tolist() for i in names])
+            for step, model_values in zip(steps, values):
+                yield index, step, list(model_values), records.get(step)
+                index += 1
+        steps, columns = self._model_in_memory()
+        records = dict(
+            list(self._decoded_agent_records())[self._agent_records_spilled :]
+        )
+        values = zip(*[column.tolist() for column in columns])
+        for step, model_values in zip(steps.tolist(), values):
+            yield index, step, list(model_values), records.get(step)
+            index += 1
+
+    def _table_columns(self, table_name):
+        """All rows of a table, spilled or not, as one array per column."""
+        columns = self._table_in_memory(table_name)
+        if self._store is None:
+            return columns
+        i = list(self.tables).index(table_name)
+        spilled = [
+            [arrays["table_{}_{}".format(i, j)] for j in range(len(columns))]
+            for arrays in self._store
+        ]
+        return [_concatenate(arrays) for arrays in zip(*spilled, columns)]
+
+    def load_history(self):
+        """Read the spilled data back into memory and stop spilling, e.g. to
+        work with the full history of a run that fits in memory after all.
+        The spilled files are left in place."""
+        if self._store is None:
+            return
+        chunks = list(self._model_chunks())
+        self.collected_steps.load(_concatenate([steps for steps, _ in chunks]))
+        for i, column in enumerate(self.model_vars.values()):
+            column.load(_concatenate([columns[i] for _, columns in chunks]))
+
+        chunks = list(self._agent_chunks())
+        self._agent_records = {}
+        if sum(len(steps) for steps, _, _ in chunks):
+            steps, *columns = [
+                _concatenate(arrays)
+                for arrays in zip(
+                    *((steps, ids, *columns) for steps, ids, columns in chunks)
+                )
+            ]
+            self._agent_records.update(_split_by_step(steps, columns))
+
+        for name, table in self.tables.items():
+            for column, values in zip(list(table), self._table_columns(name)):
+                table[column] = values.tolist()
+
+        self._store = None
+        self._spilled = 0
+        self._agent_records_spilled = 0
+        self._table_rows_spilled = dict.fromkeys(self.tables, 0)
+
+    def remove_spill(self):
+        """Delete the spill directory and the data spilled to it, and stop
+        spilling. Only the collections and table rows still in memory are
+        left; call load_history() first to keep the full history."""
+        if self.spill_dir is None:
+            return
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+        self.spill_dir = None
+        self._store = None
+        self._spilled = self.collected_steps._offset
+        self._agent_records_spilled = 0
+        self._table_rows_spilled = dict.fromkeys(self.tables, 0)
 
     def add_table_row(self, table_name, row, ignore_missing=False):
         """Add a row dictionary to a specific table.
@@ -212,13 +915,50 @@ class DataCollector:
         """Turn around arguments of getattr to make it partially callable."""
         return getattr(_object, name, None)
 
+    def _first_position(self):
+        """Position of the first collection that can be read, which is not 0
+        once the spill was removed."""
+        return 0 if self._store is not None else self.collected_steps._offset
+
+    def _model_frame(self, steps, columns, start):
+        if self._is_collection_step is not None:
+            index = pd.Index(steps, name="Step")
+        else:
+            index = pd.RangeIndex(start, start + len(steps))
+        return pd.DataFrame(
+            dict(zip(self.model_vars, columns)), index=index, copy=False
+        )
+
     def get_model_vars_dataframe(self):
         """Create a pandas DataFrame from the model variables.
 
         The DataFrame has one column for each model variable, and the index is
-        (implicitly) the model tick.
+        (implicitly) the model tick. With a collection schedule, the index is
+        the step of each collection.
         """
-        return pd.DataFrame(self.model_vars)
+        if not self.model_vars:
+            return pd.DataFrame()
+        chunks = list(self._model_chunks())
+        steps = _concatenate([steps for steps, _ in chunks])
+        columns = [
+            _concatenate(arrays) for arrays in zip(*(columns for _, columns in chunks))
+        ]
+        return self._model_frame(steps, columns, self._first_position())
+
+    def iter_model_vars_dataframes(self):
+        """Yield the model variables like get_model_vars_dataframe(), as one
+        DataFrame per spill and one for the collections not spilled yet, so
+        that the full history never has to be in memory at once."""
+        start = self._first_position()
+        for steps, columns in self._model_chunks():
+            yield self._model_frame(steps, columns, start)
+            start += len(steps)
+
+    def _agent_frame(self, steps, ids, columns):
+        index = pd.MultiIndex.from_arrays([steps, ids], names=["Step", "AgentID"])
+        return pd.DataFrame(
+            dict(zip(self.agent_reporters, columns)), index=index, copy=False
+        )
 
     def get_agent_vars_dataframe(self):
         """Create a pandas DataFrame from the agent variables.
@@ -226,15 +966,47 @@ class DataCollector:
         The DataFrame has one column for each variable, with two additional
         columns for tick and agent_id.
         """
-        all_records = itertools.chain.from_iterable(self._agent_records.values())
-        rep_names = list(self.agent_reporters)
+        chunks = list(self._agent_chunks())
+        if not chunks:
+            df = pd.DataFrame(columns=["Step", "AgentID"] + list(self.agent_reporters))
+            return df.set_index(["Step", "AgentID"])
+        steps, ids, *columns = [
+            _concatenate(arrays)
+            for arrays in zip(
+                *((steps, ids, *columns) for steps, ids, columns in chunks)
+            )
+        ]
+        return self._agent_frame(steps, ids, columns)
+
+    def get_agent_vars_at(self, step):
+        """Create a pandas DataFrame of the agent variables at one step,
+        indexed by agent id, rebuilding it from the keyframe before the step
+        if the agent records are delta-encoded.
 
-        df = pd.DataFrame.from_records(
-            data=all_records,
-            columns=["Step", "AgentID"] + rep_names,
+        Args:
+            step: The step to get the agent variables of.
+        """
+        records = self._agent_record(step)
+        if records is None:
+            for steps, ids, columns in self._agent_chunks():
+                at_step = steps == step
+                if at_step.any():
+                    records = [ids[at_step]] + [column[at_step] for column in columns]
+                    break
+            else:
+                raise Exception(
+                    "No agent variables were collected at step {}.".format(step)
+                )
+        index = pd.Index(records[0], name="AgentID")
+        return pd.DataFrame(
+            dict(zip(self.agent_reporters, records[1:])), index=index, copy=False
         )
-        df = df.set_index(["Step", "AgentID"])
-        return df
+
+    def iter_agent_vars_dataframes(self):
+        """Yield the agent variables like get_agent_vars_dataframe(), as one
+        DataFrame per spill and one for the collections not spilled yet."""
+        for steps, ids, columns in self._agent_chunks():
+            yield self._agent_frame(steps, ids, columns)
 
     def get_table_dataframe(self, table_name):
         """Create a pandas DataFrame from a particular table.
@@ -242,7 +1014,10 @@ class DataCollector:
         Args:
             table_name: The name of the table to convert.
         """
-       # pd.set_option('max_columns', None)
+        # pd.set_option('max_columns', None)
         if table_name not in self.tables:
             raise Exception("No such table.")
-        return pd.DataFrame(self.tables[table_name])
+        if self._store is None:
+            return pd.DataFrame(self.tables[table_name])
+        columns = self._table_columns(table_name)
+        return pd.DataFrame(dict(zip(self.tables[table_name], columns)), copy=False)
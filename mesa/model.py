@@ -9,6 +9,8 @@ from __future__ import annotations
 
 import random
 
+import numpy as np
+
 from mesa.datacollection import DataCollector
 
 # mypy
@@ -23,6 +25,7 @@ class Model:
         obj = object.__new__(cls)
         obj._seed = kwargs.get("seed", None)
         obj.random = random.Random(obj._seed)
+        obj._np_random = None
         return obj
 
     def __init__(self, *args: Any, **kwargs: Any) -> None:
@@ -54,6 +57,21 @@ class Model:
         self.current_id += 1
         return self.current_id
 
+    @property
+    def np_random(self) -> np.random.Generator:
+        """Numpy random number generator of the model, for batched draws.
+
+        The generator is seeded from the model seed, without consuming values
+        from `self.random`, so runs with a fixed seed stay reproducible
+        regardless of whether (or when) it is first used.
+        """
+        if self._np_random is None:
+            entropy = None
+            if self._seed is not None:
+                entropy = random.Random(self._seed).getrandbits(128)
+            self._np_random = np.random.default_rng(entropy)
+        return self._np_random
+
     def reset_randomizer(self, seed: int | None = None) -> None:
         """Reset the model random number generator.
 
@@ -65,6 +83,7 @@ class Model:
             seed = self._seed
         self.random.seed(seed)
         self._seed = seed
+        self._np_random = None
 
     def initialize_data_collector(
         self, model_reporters=None, agent_reporters=None, tables=None
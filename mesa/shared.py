@@ -0,0 +1,87 @@
+"""
+Mesa Shared Memory Module
+=========================
+
+NumPy arrays that live in `multiprocessing.shared_memory` blocks, so that
+worker processes can read and write model state without copying it.
+
+A `SharedArray` pickles as just the name, shape and dtype of its block. When
+it is passed to a worker process, e.g. as an argument of
+`multiprocessing.Process` or through a `Pool`, the worker attaches to the
+same memory: reads are zero-copy and writes are seen by every process. There
+is no locking; processes that write should own disjoint parts of the array.
+"""
+from __future__ import annotations
+
+from multiprocessing import shared_memory
+
+import numpy as np
+import numpy.typing as npt
+
+
+class SharedArray:
+    """A NumPy array backed by a shared memory block.
+
+    The process that creates a SharedArray owns the block and should release
+    it with `unlink()` once no process needs it anymore; copies unpickled in
+    other processes only attach to it.
+
+    Properties:
+        array: The NumPy array on the shared memory.
+        name: Name of the shared memory block.
+    """
+
+    def __init__(
+        self, shape: int | tuple[int, ...], dtype: npt.DTypeLike = np.float64
+    ) -> None:
+        """Create a zero-filled array in a new shared memory block.
+
+        Args:
+            shape: Shape of the array.
+            dtype: Data type of the array.
+        """
+        self.shape = (shape,) if isinstance(shape, int) else tuple(shape)
+        self.dtype = np.dtype(dtype)
+        size = int(np.prod(self.shape)) * self.dtype.itemsize
+        self._shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self._owner = True
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)
+        self.array.fill(0)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def __getstate__(self) -> dict:
+        return {"name": self.name, "shape": self.shape, "dtype": self.dtype.str}
+
+    def __setstate__(self, state: dict) -> None:
+        self.shape = state["shape"]
+        self.dtype = np.dtype(state["dtype"])
+        self._shm = shared_memory.SharedMemory(name=state["name"])
+        self._owner = False
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)
+
+    def close(self) -> None:
+        """Detach this process from the block.
+
+        Views on `array` must be gone before, otherwise the memory stays
+        mapped until they are garbage collected.
+        """
+        self.array = None
+        try:
+            self._shm.close()
+        except BufferError:
+            pass
+
+    def unlink(self) -> None:
+        """Release the block; only allowed in the process that created it.
+
+        Processes that are attached keep their mapping until they close it.
+        """
+        if not self._owner:
+            raise Exception(
+                "Only the process that created a SharedArray can unlink it."
+            )
+        self._shm.unlink()
+        self._owner = False
@@ -23,6 +23,8 @@ from __future__ import annotations
 import itertools
 import collections
 import math
+from random import Random
+from types import MappingProxyType
 from warnings import warn
 
 import numpy as np
@@ -30,9 +32,11 @@ import numpy as np
 from typing import (
     Any,
     Callable,
-    List,
+    Dict,
     Iterable,
     Iterator,
+    List,
+    Mapping,
     Sequence,
     Tuple,
     TypeVar,
@@ -43,6 +47,7 @@ from typing import (
 
 # For Mypy
 from .agent import Agent
+from .shared import SharedArray
 from numbers import Real
 import numpy.typing as npt
 
@@ -55,6 +60,13 @@ Position = Union[Coordinate, FloatCoordinate, NetworkCoordinate]
 
 GridContent = Union[Agent, None]
 MultiGridContent = List[Agent]
+# MultiGrid cells are stored as insertion-ordered dicts used as ordered sets of
+# agents, and handed out as lists
+_MultiGridCell = Dict[Agent, None]
+
+# Shared, read-only content of MultiGrid cells that never held an agent; a cell
+# gets its own dict when the first agent is placed in it.
+_EMPTY_CELL: _MultiGridCell = MappingProxyType({})
 
 F = TypeVar("F", bound=Callable[..., Any])
 
@@ -91,12 +103,24 @@ class Grid:
         grid: Internal list-of-lists which holds the grid cells themselves.
     """
 
-    def __init__(self, width: int, height: int, torus: bool) -> None:
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        torus: bool,
+        neighborhood_cache_size: int | None = 65536,
+    ) -> None:
         """Create a new grid.
 
         Args:
             width, height: The width and height of the grid
             torus: Boolean whether the grid wraps or not.
+            neighborhood_cache_size: Maximum number of neighborhood lists that
+                are cached, 65536 by default; the oldest entry is evicted when
+                it is exceeded. None caches without limit, which can hold a
+                list per cell and neighborhood shape, and 0 disables the
+                cache. Neighborhoods are computed from precomputed offset
+                stencils, so a small cache costs little speed.
         """
         self.height = height
         self.width = width
@@ -104,21 +128,53 @@ class Grid:
         self.num_cells = height * width
 
         self.grid: list[list[GridContent]]
-        self.grid = [
-            [self.default_val() for _ in range(self.height)] for _ in range(self.width)
-        ]
+        self.grid = self._new_grid()
 
-        # Add all cells to the empties list.
-        self.empties = set(itertools.product(range(self.width), range(self.height)))
+        # The set of empty cells is only built when it is first needed, since
+        # it holds a tuple per cell; it is kept up to date from then on.
+        self._empties: set[Coordinate] | None = None
 
         # Neighborhood Cache
         self._neighborhood_cache: dict[Any, list[Coordinate]] = dict()
+        self.neighborhood_cache_size = neighborhood_cache_size
+        # Offset stencils and neighbor index tables, keyed by
+        # (moore, include_center, radius); both are independent of the position.
+        self._stencils: dict[tuple[bool, bool, int], list[Coordinate]] = {}
+        self._neighborhood_tables: dict[
+            tuple[bool, bool, int], npt.NDArray[np.int32]
+        ] = {}
 
     @staticmethod
     def default_val() -> None:
         """Default value for new cell elements."""
         return None
 
+    def _new_grid(self) -> list[list[GridContent]]:
+        """Create the list-of-lists of empty cells."""
+        return [
+            [self.default_val() for _ in range(self.height)] for _ in range(self.width)
+        ]
+
+    @property
+    def empties(self) -> set[Coordinate]:
+        """The set of the coordinates of all empty cells."""
+        if self._empties is None:
+            self._empties = self._build_empties()
+        return self._empties
+
+    @empties.setter
+    def empties(self, empties: set[Coordinate]) -> None:
+        self._empties = empties
+
+    def _build_empties(self) -> set[Coordinate]:
+        """Collect the coordinates of all empty cells."""
+        return {
+            (x, y)
+            for x in range(self.width)
+            for y in range(self.height)
+            if self.is_cell_empty((x, y))
+        }
+
     @overload
     def __getitem__(self, index: int) -> list[GridContent]:
         ...
@@ -255,15 +311,61 @@ class Grid:
         if neighborhood is not None:
             return neighborhood
 
+        stencil = self.get_neighborhood_offsets(moore, include_center, radius)
+        x, y = pos
+        if self.torus:
+            width, height = self.width, self.height
+            neighborhood = [((x + dx) % width, (y + dy) % height) for dx, dy in stencil]
+        else:
+            neighborhood = [
+                (x + dx, y + dy)
+                for dx, dy in stencil
+                if 0 <= x + dx < self.width and 0 <= y + dy < self.height
+            ]
+
+        self._cache_neighborhood(cache_key, neighborhood)
+
+        return neighborhood
+
+    def _cache_neighborhood(
+        self, cache_key: Any, neighborhood: list[Coordinate]
+    ) -> None:
+        """Store a neighborhood, evicting the oldest entry if the cache is full."""
+        max_size = self.neighborhood_cache_size
+        if max_size is not None:
+            if max_size <= 0:
+                return
+            if len(self._neighborhood_cache) >= max_size:
+                del self._neighborhood_cache[next(iter(self._neighborhood_cache))]
+        self._neighborhood_cache[cache_key] = neighborhood
+
+    def get_neighborhood_offsets(
+        self, moore: bool, include_center: bool = False, radius: int = 1
+    ) -> list[Coordinate]:
+        """Return the (dx, dy) offsets that make up a neighborhood.
+
+        The offsets are in the same order as the cells returned by
+        `get_neighborhood`. On a torus, adding them to any position and
+        wrapping gives its neighborhood, without duplicates; otherwise the
+        cells that fall off the grid have to be dropped.
+
+        Args:
+            moore: If True, Moore neighborhood (including diagonals),
+                   otherwise Von Neumann neighborhood (exclude diagonals)
+            include_center: If True, include the (0, 0) offset.
+            radius: radius, in cells, of the neighborhood.
+        """
+        key = (moore, include_center, radius)
+        stencil = self._stencils.get(key)
+        if stencil is not None:
+            return stencil
+
         # We use a list instead of a dict for the neighborhood because it would
         # be easier to port the code to Cython or Numba (for performance
         # purpose), with minimal changes. To better understand how the
         # algorithm was conceived, look at
         # https://github.com/projectmesa/mesa/pull/1476#issuecomment-1306220403
         # and the discussion in that PR in general.
-        neighborhood = []
-
-        x, y = pos
         if self.torus:
             x_max_radius, y_max_radius = self.width // 2, self.height // 2
             x_radius, y_radius = min(radius, x_max_radius), min(radius, y_max_radius)
@@ -277,33 +379,91 @@ class Grid:
             xdim_even, ydim_even = (self.width + 1) % 2, (self.height + 1) % 2
             kx = int(x_radius == x_max_radius and xdim_even)
             ky = int(y_radius == y_max_radius and ydim_even)
-
-            for dx in range(-x_radius, x_radius + 1 - kx):
-                for dy in range(-y_radius, y_radius + 1 - ky):
-
-                    if not moore and abs(dx) + abs(dy) > radius:
-                        continue
-
-                    nx, ny = (x + dx) % self.width, (y + dy) % self.height
-                    neighborhood.append((nx, ny))
+            dx_range = range(-x_radius, x_radius + 1 - kx)
+            dy_range = range(-y_radius, y_radius + 1 - ky)
         else:
-            x_range = range(max(0, x - radius), min(self.width, x + radius + 1))
-            y_range = range(max(0, y - radius), min(self.height, y + radius + 1))
-
-            for nx in x_range:
-                for ny in y_range:
+            dx_range = dy_range = range(-radius, radius + 1)
+
+        stencil = [
+            (dx, dy)
+            for dx in dx_range
+            for dy in dy_range
+            if (moore or abs(dx) + abs(dy) <= radius)
+            and (include_center or (dx, dy) != (0, 0))
+        ]
+        self._stencils[key] = stencil
+        return stencil
 
-                    if not moore and abs(nx - x) + abs(ny - y) > radius:
-                        continue
+    def get_neighborhood_table(
+        self, moore: bool, include_center: bool = False, radius: int = 1
+    ) -> npt.NDArray[np.int32]:
+        """Return the neighborhoods of all cells as a flat index table.
 
-                    neighborhood.append((nx, ny))
+        Cells are numbered `x * height + y`. Row `i` of the returned
+        (num_cells, k) int32 array holds the numbers of the cells in the
+        neighborhood of cell `i`, in `get_neighborhood` order. On a
+        non-toroidal grid the rows of border cells are padded with -1.
 
-        if not include_center and neighborhood:
-            neighborhood.remove(pos)
+        The table takes 4 * k bytes per cell and is built once per
+        (moore, include_center, radius).
+        """
+        key = (moore, include_center, radius)
+        table = self._neighborhood_tables.get(key)
+        if table is not None:
+            return table
+
+        stencil = np.array(
+            self.get_neighborhood_offsets(moore, include_center, radius), dtype=np.int64
+        ).reshape(-1, 2)
+        xs, ys = np.divmod(np.arange(self.num_cells, dtype=np.int64), self.height)
+        nx = xs[:, None] + stencil[None, :, 0]
+        ny = ys[:, None] + stencil[None, :, 1]
+        if self.torus:
+            table = (nx % self.width) * self.height + ny % self.height
+        else:
+            inside = (nx >= 0) & (nx < self.width) & (ny >= 0) & (ny < self.height)
+            table = np.where(inside, nx * self.height + ny, -1)
+            # Move the padding to the end of each row, keeping the order.
+            order = np.argsort(~inside, axis=1, kind="stable")
+            table = np.take_along_axis(table, order, axis=1)
+        table = table.astype(np.int32)
+        table.flags.writeable = False
+        self._neighborhood_tables[key] = table
+        return table
+
+    def random_neighborhood_cell(
+        self,
+        pos: Coordinate,
+        moore: bool,
+        include_center: bool,
+        random: Random,
+        radius: int = 1,
+    ) -> Coordinate:
+        """Pick a random cell of the neighborhood of `pos`.
 
-        self._neighborhood_cache[cache_key] = neighborhood
+        The pick consumes the random number generator exactly like
+        `random.choice(self.get_neighborhood(pos, moore, include_center, radius))`,
+        but on a torus and away from the borders of other grids no
+        neighborhood list is built.
 
-        return neighborhood
+        Args:
+            pos: Coordinate tuple for the neighborhood to pick from.
+            moore: If True, Moore neighborhood (including diagonals),
+                   otherwise Von Neumann neighborhood (exclude diagonals)
+            include_center: If True, `pos` itself may be picked.
+            random: Random number generator to pick with, e.g. `model.random`.
+            radius: radius, in cells, of the neighborhood.
+        """
+        x, y = pos
+        if self.torus:
+            stencil = self.get_neighborhood_offsets(moore, include_center, radius)
+            dx, dy = stencil[random.randrange(len(stencil))]
+            return (x + dx) % self.width, (y + dy) % self.height
+        if radius <= x < self.width - radius and radius <= y < self.height - radius:
+            stencil = self.get_neighborhood_offsets(moore, include_center, radius)
+            dx, dy = stencil[random.randrange(len(stencil))]
+            return x + dx, y + dy
+        return random.choice(self.get_neighborhood(pos, moore, include_center, radius))
 
     def iter_neighbors(
         self,
@@ -421,7 +581,8 @@ class Grid:
         """Place the agent at the specified location, and set its pos variable."""
         x, y = pos
         self.grid[x][y] = agent
-        self.empties.discard(pos)
+        if self._empties is not None:
+            self._empties.discard(pos)
         agent.pos = pos
 
     def remove_agent(self, agent: Agent) -> None:
@@ -430,7 +591,8 @@ class Grid:
             return
         x, y = pos
         self.grid[x][y] = self.default_val()
-        self.empties.add(pos)
+        if self._empties is not None:
+            self._empties.add(pos)
         agent.pos = None
 
     def swap_pos(self, agent_a: Agent, agent_b: Agent) -> None:
@@ -470,7 +632,7 @@ class Grid:
                 ),
                 DeprecationWarning,
             )
-        num_empty_cells = len(self.empties)
+        num_empty_cells = self._count_empty_cells()
         if num_empty_cells == 0:
             raise Exception("ERROR: No empty cells")
 
@@ -488,10 +650,18 @@ class Grid:
                 if self.is_cell_empty(new_pos):
                     break
         else:
-            new_pos = agent.random.choice(sorted(self.empties))
+            new_pos = self._choose_empty_cell(agent.random)
         self.remove_agent(agent)
         self.place_agent(agent, new_pos)
 
+    def _count_empty_cells(self) -> int:
+        """Returns the number of empty cells."""
+        return len(self.empties)
+
+    def _choose_empty_cell(self, random: Random) -> Coordinate:
+        """Pick a uniformly random empty cell; there must be at least one."""
+        return random.choice(sorted(self.empties))
+
     def find_empty(self) -> Coordinate | None:
         """Pick a random empty cell."""
         import random
@@ -514,7 +684,7 @@ class Grid:
 
     def exists_empty_cells(self) -> bool:
         """Return True if any cells empty else False."""
-        return len(self.empties) > 0
+        return self._count_empty_cells() > 0
 
 
 class SingleGrid(Grid):
@@ -565,6 +735,62 @@ class SingleGrid(Grid):
             raise Exception("Cell not empty")
 
 
+class _GridColumn:
+    """A column of MultiGrid cells, as returned by `grid[x]`, that hands out
+    only the cells that are indexed, each as a list of its agents."""
+
+    __slots__ = ("_cells",)
+
+    def __init__(self, cells: list[_MultiGridCell]) -> None:
+        self._cells = cells
+
+    def __getitem__(self, y: int | slice) -> MultiGridContent | list[MultiGridContent]:
+        if isinstance(y, slice):
+            return [list(cell) for cell in self._cells[y]]
+        return list(self._cells[y])
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    def __iter__(self) -> Iterator[MultiGridContent]:
+        return map(list, self._cells)
+
+
+class _TypeBucket:
+    """The agents of one type in one MultiGrid cell, in the order they were
+    placed there, like the cell itself: an insertion-ordered dict, so agents
+    are added and removed in O(1), and a list of its agents for picking a
+    random one in O(1). A removal drops the list, which is rebuilt by the
+    next pick."""
+
+    __slots__ = ("_agents", "_list")
+
+    def __init__(self) -> None:
+        self._agents: dict[Agent, None] = {}
+        self._list: list[Agent] | None = []
+
+    def add(self, agent: Agent) -> None:
+        self._agents[agent] = None
+        if self._list is not None:
+            self._list.append(agent)
+
+    def remove(self, agent: Agent) -> None:
+        del self._agents[agent]
+        self._list = None
+
+    @property
+    def agents(self) -> list[Agent]:
+        if self._list is None:
+            self._list = list(self._agents)
+        return self._list
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+    def __iter__(self) -> Iterator[Agent]:
+        return iter(self._agents)
+
+
 class MultiGrid(Grid):
     """Grid where each cell can contain more than one object.
 
@@ -572,47 +798,439 @@ class MultiGrid(Grid):
     bottom-left and [width-1][height-1] is the top-right. If a grid is
     toroidal, the top and bottom, and left and right, edges wrap to each other.
 
-    Each grid cell holds a set object.
+    Each grid cell holds an insertion-ordered dict whose keys are the agents
+    in the cell (the values are unused), so agents can be added, removed and
+    looked up in O(1) while the cell still iterates in a deterministic order.
+    Indexing and iterating the grid return the cells as new lists of their
+    agents, in the order they were placed; change the cells with
+    `place_agent`, `remove_agent` and `move_agent`, not through these lists.
 
     Properties:
         width, height: The grid's width and height.
 
         torus: Boolean which determines whether to treat the grid as a torus.
 
-        grid: Internal list-of-lists which holds the grid cells themselves.
+        grid: Internal list-of-lists which holds the grid cells themselves,
+              as dicts.
+
+        track_types: Boolean whether the agents of each cell are also indexed
+                     by their type, see `get_cell_type_count`.
+
+        track_occupancy: Boolean whether the number of agents per cell is
+                         also kept in an int32 array, see `occupancy`.
+
+        shared_occupancy: Boolean whether the occupancy arrays live in shared
+                          memory, see `get_shared_occupancy`.
 
     Methods:
         get_neighbors: Returns the objects surrounding a given cell.
     """
 
-    grid: list[list[MultiGridContent]]
+    grid: list[list[_MultiGridCell]]
+
+    def __init__(
+        self,
+        width: int,
+        height: int,
+        torus: bool,
+        track_types: bool = False,
+        track_occupancy: bool = False,
+        neighborhood_cache_size: int | None = 65536,
+        shared_occupancy: bool = False,
+    ) -> None:
+        """Create a new multi grid.
+
+        Args:
+            width, height: The width and height of the grid
+            torus: Boolean whether the grid wraps or not.
+            track_types: If True, keep a per-type index of the agents in each
+                         cell, so that the agents of a given type in a cell
+                         can be counted and picked from without scanning the
+                         cell.
+            track_occupancy: If True, keep the number of agents per cell in an
+                             int32 array, and, if `track_types` is also set,
+                             one such array per agent type. Empty cell
+                             lookups then work on the array instead of the
+                             set of empty cells.
+            neighborhood_cache_size: Maximum number of cached neighborhood
+                                     lists, see `Grid`.
+            shared_occupancy: If True, and `track_occupancy` is set, allocate
+                              the occupancy arrays in shared memory, so other
+                              processes can read them without copying.
+        """
+        super().__init__(width, height, torus, neighborhood_cache_size)
+        self.track_types = track_types
+        # Sparse index: agent type -> occupied position -> agents of that type
+        self._type_buckets: dict[
+            type[Agent], dict[Coordinate, _TypeBucket]
+        ] = collections.defaultdict(dict)
+
+        self.track_occupancy = track_occupancy
+        self.shared_occupancy = shared_occupancy and track_occupancy
+        # Shared memory blocks behind the occupancy arrays, by agent type;
+        # None is the block of the total occupancy.
+        self._shared_blocks: dict[type[Agent] | None, SharedArray] = {}
+        self._occupancy: npt.NDArray[np.int32] | None = None
+        self._layer_occupancy: dict[type[Agent], npt.NDArray[np.int32]] = {}
+        if track_occupancy:
+            self._occupancy = self._new_occupancy_array(None)
+
+    def _new_occupancy_array(
+        self, agent_type: type[Agent] | None
+    ) -> npt.NDArray[np.int32]:
+        """Returns a zeroed (width, height) int32 array, in shared memory if
+        the grid shares its occupancy."""
+        if not self.shared_occupancy:
+            return np.zeros((self.width, self.height), dtype=np.int32)
+        block = self._shared_blocks[agent_type] = SharedArray(
+            (self.width, self.height), np.int32
+        )
+        return block.array
+
+    def get_shared_occupancy(
+        self, agent_type: type[Agent] | None = None
+    ) -> SharedArray:
+        """Returns the shared memory block of the occupancy array, or of the
+        occupancy layer of `agent_type`.
+
+        The returned `SharedArray` can be passed to worker processes, which
+        then read the number of agents per cell (`.array[x, y]`) of the live
+        grid without copying it. Workers must not write to it.
+
+        Only available if the grid was created with `track_occupancy=True`
+        and `shared_occupancy=True` (and `track_types=True` for a layer).
+        """
+        if not self.shared_occupancy:
+            raise Exception("The grid does not share its occupancy.")
+        if agent_type is not None:
+            if not self.track_types:
+                raise Exception("The grid does not track its occupancy per type.")
+            if agent_type not in self._layer_occupancy:
+                self._layer_occupancy[agent_type] = self._new_occupancy_array(
+                    agent_type
+                )
+        return self._shared_blocks[agent_type]
+
+    def release_shared_occupancy(self) -> None:
+        """Move the occupancy arrays into private memory and release their
+        shared memory blocks; processes still attached keep the last state."""
+        if not self.shared_occupancy:
+            return
+        self._occupancy = self._occupancy.copy()
+        self._layer_occupancy = {
+            agent_type: layer.copy()
+            for agent_type, layer in self._layer_occupancy.items()
+        }
+        for block in self._shared_blocks.values():
+            block.unlink()
+            block.close()
+        self._shared_blocks = {}
+        self.shared_occupancy = False
+
+    def _new_grid(self) -> list[list[_MultiGridCell]]:
+        """Create the list-of-lists of cells, all sharing one read-only empty
+        cell until an agent is placed in them."""
+        return [[_EMPTY_CELL] * self.height for _ in range(self.width)]
+
+    def __getitem__(self, index):
+        """Access contents from the grid, see `Grid.__getitem__`; every cell
+        is returned as a new list of its agents, and `grid[x]` as a view of
+        the column that only copies the cells it is indexed with."""
+        if isinstance(index, int):
+            return _GridColumn(self.grid[index])
+        content = super().__getitem__(index)
+        if isinstance(content, Mapping):
+            return list(content)
+        return [list(cell) for cell in content]
+
+    def __iter__(self) -> Iterator[MultiGridContent]:
+        """Iterate over the cells, each as a list of its agents."""
+        return map(list, super().__iter__())
+
+    def coord_iter(self) -> Iterator[tuple[MultiGridContent, int, int]]:
+        """An iterator that returns coordinates as well as cell contents, each
+        cell as a list of its agents."""
+        for x, column in enumerate(self.grid):
+            for y, cell in enumerate(column):
+                yield list(cell), x, y
+
+    @property
+    def occupancy(self) -> npt.NDArray[np.int32]:
+        """Read-only (width, height) view of the number of agents per cell.
+
+        Only available if the grid was created with `track_occupancy=True`.
+        """
+        if self._occupancy is None:
+            raise Exception("The grid does not track its occupancy.")
+        view = self._occupancy.view()
+        view.flags.writeable = False
+        return view
+
+    def get_layer_occupancy(self, agent_type: type[Agent]) -> npt.NDArray[np.int32]:
+        """Returns a read-only (width, height) view of the number of agents of
+        exactly type `agent_type` per cell.
+
+        Only available if the grid was created with both `track_types=True` and
+        `track_occupancy=True`.
+        """
+        if self._occupancy is None or not self.track_types:
+            raise Exception("The grid does not track its occupancy per type.")
+        layer = self._layer_occupancy.get(agent_type)
+        if layer is None:
+            layer = np.zeros((self.width, self.height), dtype=np.int32)
+        view = layer.view()
+        view.flags.writeable = False
+        return view
+
+    def _build_empties(self) -> set[Coordinate]:
+        if self._occupancy is None:
+            return super()._build_empties()
+        return set(map(tuple, np.argwhere(self._occupancy == 0).tolist()))
+
+    def _count_empty_cells(self) -> int:
+        if self._occupancy is None:
+            return super()._count_empty_cells()
+        return self.num_cells - int(np.count_nonzero(self._occupancy))
+
+    def _choose_empty_cell(self, random: Random) -> Coordinate:
+        if self._occupancy is None:
+            return super()._choose_empty_cell(random)
+        # argwhere returns the cells in the same (x, y) order as sorting the
+        # set of empties, so the pick is the same as in the set-based version.
+        empty_cells = np.argwhere(self._occupancy == 0)
+        x, y = empty_cells[random.randrange(len(empty_cells))].tolist()
+        return x, y
 
     @staticmethod
-    def default_val() -> MultiGridContent:
+    def default_val() -> _MultiGridCell:
         """Default value for new cell elements."""
-        return []
+        return {}
 
     def place_agent(self, agent: Agent, pos: Coordinate) -> None:
         """Place the agent at the specified location, and set its pos variable."""
         x, y = pos
-        if agent.pos is None or agent not in self.grid[x][y]:
-            self.grid[x][y].append(agent)
+        cell = self.grid[x][y]
+        if agent.pos is None or agent not in cell:
+            if cell is _EMPTY_CELL:
+                cell = self.grid[x][y] = {}
+            cell[agent] = None
             agent.pos = pos
-            self.empties.discard(pos)
+            if self._empties is not None:
+                self._empties.discard(pos)
+            if self._occupancy is not None:
+                self._occupancy[x, y] += 1
+                if self.track_types:
+                    layer = self._layer_occupancy.get(type(agent))
+                    if layer is None:
+                        layer = self._layer_occupancy[
+                            type(agent)
+                        ] = self._new_occupancy_array(type(agent))
+                    layer[x, y] += 1
+            if self.track_types:
+                cells = self._type_buckets[type(agent)]
+                bucket = cells.get(pos)
+                if bucket is None:
+                    bucket = cells[pos] = _TypeBucket()
+                bucket.add(agent)
 
     def remove_agent(self, agent: Agent) -> None:
         """Remove the agent from the given location and set its pos attribute to None."""
         pos = agent.pos
         x, y = pos
-        self.grid[x][y].remove(agent)
-        if self.is_cell_empty(pos):
-            self.empties.add(pos)
+        cell = self.grid[x][y]
+        del cell[agent]
+        if not cell and self._empties is not None:
+            self._empties.add(pos)
+        if self._occupancy is not None:
+            self._occupancy[x, y] -= 1
+            if self.track_types:
+                self._layer_occupancy[type(agent)][x, y] -= 1
+        if self.track_types:
+            cells = self._type_buckets[type(agent)]
+            bucket = cells[pos]
+            bucket.remove(agent)
+            if not bucket:
+                del cells[pos]
         agent.pos = None
 
+    def move_agents(self, agents: Sequence[Agent], offsets: npt.ArrayLike) -> None:
+        """Move many agents at once, each by its own (dx, dy) offset.
+
+        The target positions are computed as one array operation, and the
+        cells, empties, type index and occupancy arrays are updated in a
+        single pass. Agents with a (0, 0) offset stay where they are.
+
+        Args:
+            agents: Sequence of agents on the grid.
+            offsets: Array-like of shape (len(agents), 2) of (dx, dy) offsets.
+        """
+        if not len(agents):
+            return
+        old = np.array([agent.pos for agent in agents], dtype=np.int64)
+        new = old + np.asarray(offsets, dtype=np.int64).reshape(-1, 2)
+        if self.torus:
+            new %= (self.width, self.height)
+        elif (new < 0).any() or (new >= (self.width, self.height)).any():
+            raise Exception("Point out of bounds, and space non-toroidal.")
+        moving = (old != new).any(axis=1)
+        if not moving.all():
+            agents = [agent for agent, m in zip(agents, moving.tolist()) if m]
+            old, new = old[moving], new[moving]
+
+        grid = self.grid
+        empties = self._empties
+        track_types = self.track_types
+        type_buckets = self._type_buckets
+        for agent, (x, y) in zip(agents, new.tolist()):
+            old_pos = agent.pos
+            ox, oy = old_pos
+            old_cell = grid[ox][oy]
+            del old_cell[agent]
+            if not old_cell and empties is not None:
+                empties.add(old_pos)
+            cell = grid[x][y]
+            if cell is _EMPTY_CELL:
+                cell = grid[x][y] = {}
+            cell[agent] = None
+            pos = (x, y)
+            if empties is not None:
+                empties.discard(pos)
+            agent.pos = pos
+            if track_types:
+                cells = type_buckets[type(agent)]
+                bucket = cells[old_pos]
+                bucket.remove(agent)
+                if not bucket:
+                    del cells[old_pos]
+                bucket = cells.get(pos)
+                if bucket is None:
+                    bucket = cells[pos] = _TypeBucket()
+                bucket.add(agent)
+
+        if self._occupancy is not None:
+            np.subtract.at(self._occupancy, (old[:, 0], old[:, 1]), 1)
+            np.add.at(self._occupancy, (new[:, 0], new[:, 1]), 1)
+            if self.track_types:
+                types = np.array([id(type(agent)) for agent in agents])
+                for agent_type, layer in self._layer_occupancy.items():
+                    mask = types == id(agent_type)
+                    np.subtract.at(layer, (old[mask, 0], old[mask, 1]), 1)
+                    np.add.at(layer, (new[mask, 0], new[mask, 1]), 1)
+
+    def random_move_agents(
+        self,
+        agents: Sequence[Agent],
+        moore: bool,
+        include_center: bool,
+        rng: np.random.Generator,
+        radius: int = 1,
+    ) -> None:
+        """Move each agent to a uniformly random cell of its neighborhood.
+
+        All random draws are made at once from `rng`, e.g. `model.np_random`,
+        and the moves are applied with `move_agents`. This is the batched
+        counterpart of picking `random.choice(self.get_neighborhood(...))` and
+        calling `move_agent` for every agent, but it does not reproduce the
+        random stream of that version.
+
+        Args:
+            agents: Sequence of agents on the grid.
+            moore: If True, Moore neighborhood (including diagonals),
+                   otherwise Von Neumann neighborhood (exclude diagonals)
+            include_center: If True, agents may stay in their cell.
+            rng: Numpy random number generator to draw the moves from.
+            radius: radius, in cells, of the neighborhood.
+        """
+        if not len(agents):
+            return
+        if self.torus:
+            stencil = np.array(
+                self.get_neighborhood_offsets(moore, include_center, radius),
+                dtype=np.int64,
+            )
+            offsets = stencil[rng.integers(len(stencil), size=len(agents))]
+        else:
+            # Neighborhoods are clipped at the borders, so pick from each row
+            # of the neighbor table among its valid (non-negative) entries.
+            table = self.get_neighborhood_table(moore, include_center, radius)
+            old = np.array([agent.pos for agent in agents], dtype=np.int64)
+            rows = table[old[:, 0] * self.height + old[:, 1]]
+            sizes = (rows >= 0).sum(axis=1)
+            picks = (rng.random(len(agents)) * sizes).astype(np.int64)
+            targets = rows[np.arange(len(agents)), picks]
+            offsets = np.stack(np.divmod(targets, self.height), axis=1) - old
+        self.move_agents(agents, offsets)
+
+    def iter_cell_type_contents(
+        self, pos: Coordinate, agent_type: type[Agent]
+    ) -> Iterator[Agent]:
+        """Returns an iterator of the agents of exactly type `agent_type` in the
+        cell at `pos`, in the order in which they were placed there.
+
+        Args:
+            pos: (x, y) tuple of the cell.
+            agent_type: Class of the agents to return; subclasses are not
+                        included.
+        """
+        if self.track_types:
+            return iter(self._type_buckets[agent_type].get(pos, ()))
+        x, y = pos
+        return (agent for agent in self.grid[x][y] if type(agent) is agent_type)
+
+    def get_cell_type_contents(
+        self, pos: Coordinate, agent_type: type[Agent]
+    ) -> list[Agent]:
+        """Returns a list of the agents of exactly type `agent_type` in the cell
+        at `pos`; see `iter_cell_type_contents`.
+        """
+        return list(self.iter_cell_type_contents(pos, agent_type))
+
+    def get_cell_type_count(self, pos: Coordinate, agent_type: type[Agent]) -> int:
+        """Returns the number of agents of exactly type `agent_type` in the cell
+        at `pos`. This is O(1) if the grid tracks types.
+        """
+        if self.track_types:
+            return len(self._type_buckets[agent_type].get(pos, ()))
+        return sum(1 for _ in self.iter_cell_type_contents(pos, agent_type))
+
+    def is_cell_empty(self, pos: Coordinate) -> bool:
+        """Returns a bool of the contents of a cell."""
+        x, y = pos
+        return not self.grid[x][y]
+
+    def random_cell_agent_of_type(
+        self, pos: Coordinate, agent_type: type[Agent], random: Random
+    ) -> Agent | None:
+        """Pick a random agent of exactly type `agent_type` in the cell at `pos`.
+
+        The pick consumes the random number generator exactly like
+        `random.choice(self.get_cell_type_contents(pos, agent_type))` does, and
+        picks the same agent, but without filtering the cell if the grid tracks
+        types: in O(1), unless an agent of the type left the cell since the last
+        pick.
+
+        Args:
+            pos: (x, y) tuple of the cell.
+            agent_type: Class of the agent to pick; subclasses are not included.
+            random: Random number generator to pick with, e.g. `model.random`.
+
+        Returns:
+            The picked agent, or None if there is no such agent in the cell.
+        """
+        if self.track_types:
+            bucket = self._type_buckets[agent_type].get(pos)
+            if not bucket:
+                return None
+            return bucket.agents[random.randrange(len(bucket))]
+        candidates = self.get_cell_type_contents(pos, agent_type)
+        if not candidates:
+            return None
+        return random.choice(candidates)
+
     @accept_tuple_argument
     def iter_cell_list_contents(
         self, cell_list: Iterable[Coordinate]
-    ) -> Iterator[MultiGridContent]:
+    ) -> Iterator[Agent]:
         """Returns an iterator of the contents of the
         cells identified in cell_list.
 
@@ -623,7 +1241,7 @@ class MultiGrid(Grid):
             A iterator of the contents of the cells identified in cell_list
         """
         return itertools.chain.from_iterable(
-            self[x][y] for x, y in cell_list if not self.is_cell_empty((x, y))
+            self.grid[x][y] for x, y in cell_list if not self.is_cell_empty((x, y))
         )
 
 
@@ -734,7 +1352,7 @@ class HexGrid(Grid):
             coordinates.discard(pos)
 
         neighborhood = sorted(coordinates)
-        self._neighborhood_cache[cache_key] = neighborhood
+        self._cache_neighborhood(cache_key, neighborhood)
 
         return neighborhood
 
@@ -25,10 +25,14 @@ Key concepts:
 # Remove this __future__ import once the oldest supported Python is 3.10
 from __future__ import annotations
 
+import contextlib
 from collections import defaultdict
 
 # mypy
 from typing import Iterator, Union
+
+import numpy as np
+
 from mesa.agent import Agent
 from mesa.model import Model
 
@@ -44,14 +48,31 @@ class BaseScheduler:
     Assumes that each agent added has a *step* method which takes no arguments.
 
     (This is explicitly meant to replicate the scheduler in MASON).
+
+    With `deferred=True`, agents added or removed while the schedule is
+    stepping are queued and committed together at the end of the step. The
+    agents are then activated from a stable snapshot of the schedule instead
+    of checking for every agent whether it is still scheduled; agents removed
+    earlier in the same step are still skipped. During the step, `agents` and
+    `get_agent_count` reflect the schedule as it was when the step started.
     """
 
-    def __init__(self, model: Model) -> None:
-        """Create a new, empty BaseScheduler."""
+    def __init__(self, model: Model, deferred: bool = False) -> None:
+        """Create a new, empty BaseScheduler.
+
+        Args:
+            model: Model object associated with the schedule.
+            deferred: If True, queue additions and removals made during a step
+                      and commit them at the end of the step.
+        """
         self.model = model
         self.steps = 0
         self.time: TimeT = 0
         self._agents: dict[int, Agent] = {}
+        self.deferred = deferred
+        self._deferring = False
+        self._pending_add: dict[int, Agent] = {}
+        self._pending_remove: dict[int, Agent] = {}
 
     def add(self, agent: Agent) -> None:
         """Add an Agent object to the schedule.
@@ -60,6 +81,20 @@ class BaseScheduler:
             agent: An Agent to be added to the schedule. NOTE: The agent must
             have a step() method.
         """
+        if self._deferring:
+            if agent.unique_id in self._pending_add or (
+                agent.unique_id in self._agents
+                and agent.unique_id not in self._pending_remove
+            ):
+                raise Exception(
+                    f"Agent with unique id {repr(agent.unique_id)} already added to scheduler"
+                )
+            self._pending_add[agent.unique_id] = agent
+            return
+        self._add(agent)
+
+    def _add(self, agent: Agent) -> None:
+        """Insert an agent into the schedule right away."""
         if agent.unique_id in self._agents:
             raise Exception(
                 f"Agent with unique id {repr(agent.unique_id)} already added to scheduler"
@@ -73,12 +108,46 @@ class BaseScheduler:
         Args:
             agent: An agent object.
         """
+        if self._deferring:
+            if self._pending_add.pop(agent.unique_id, None) is None:
+                if agent.unique_id not in self._agents:
+                    raise KeyError(agent.unique_id)
+                self._pending_remove[agent.unique_id] = agent
+            return
+        self._remove(agent)
+
+    def _remove(self, agent: Agent) -> None:
+        """Remove an agent from the schedule right away."""
         del self._agents[agent.unique_id]
 
+    def commit(self) -> None:
+        """Apply the queued removals, then the queued additions."""
+        pending_remove, self._pending_remove = self._pending_remove, {}
+        pending_add, self._pending_add = self._pending_add, {}
+        for agent in pending_remove.values():
+            self._remove(agent)
+        for agent in pending_add.values():
+            self._add(agent)
+
+    @contextlib.contextmanager
+    def _deferring_changes(self) -> Iterator[None]:
+        """Queue additions and removals while stepping, if the schedule is
+        deferred, and commit them afterwards."""
+        if not self.deferred or self._deferring:
+            yield
+            return
+        self._deferring = True
+        try:
+            yield
+        finally:
+            self._deferring = False
+            self.commit()
+
     def step(self) -> None:
         """Execute the step of all the agents, one at a time."""
-        for agent in self.agent_buffer(shuffled=False):
-            agent.step()
+        with self._deferring_changes():
+            for agent in self.agent_buffer(shuffled=False):
+                agent.step()
         self.steps += 1
         self.time += 1
 
@@ -94,19 +163,47 @@ class BaseScheduler:
         """Simple generator that yields the agents while letting the user
         remove and/or add agents during stepping.
         """
+        if self._deferring:
+            yield from self._snapshot_buffer(self._agents, shuffled)
+            return
+
         # To be able to remove and/or add agents during stepping
         # it's necessary to cast the keys view to a list.
         agent_keys = list(self._agents.keys())
-        #print(agent_keys)
+        # print(agent_keys)
         if shuffled:
             self.model.random.shuffle(agent_keys)
-        #print(agent_keys)
+        # print(agent_keys)
 
         for agent_key in agent_keys:
-            #print(str(self._agents[agent_key].name)+"_"+str(self._agents[agent_key].unique_id))
+            # print(str(self._agents[agent_key].name)+"_"+str(self._agents[agent_key].unique_id))
             if agent_key in self._agents:
                 yield self._agents[agent_key]
 
+    def _snapshot_buffer(
+        self, agents: dict[int, Agent], shuffled: bool
+    ) -> Iterator[Agent]:
+        """Yield the given agents while changes to the schedule are deferred.
+
+        The dict does not change until the changes are committed, so it is
+        iterated directly (or shuffled the same way `agent_buffer` shuffles
+        its keys); only agents whose removal is pending are skipped. Those
+        are left out before shuffling, as they are already gone from the
+        dict an immediate schedule would shuffle, e.g. agents removed in an
+        earlier type stage, so both draw the same order.
+        """
+        removed = self._pending_remove
+        if shuffled:
+            agents = [
+                agent for agent in agents.values() if agent.unique_id not in removed
+            ]
+            self.model.random.shuffle(agents)
+        else:
+            agents = agents.values()
+        for agent in agents:
+            if not removed or agent.unique_id not in removed:
+                yield agent
+
 
 class RandomActivation(BaseScheduler):
     """A scheduler which activates each agent once per step, in random order,
@@ -116,14 +213,115 @@ class RandomActivation(BaseScheduler):
     default behavior for an ABM.
 
     Assumes that all agents have a step(model) method.
+
+    The order is drawn from one of two random number generators:
+        "random" (default): the agent ids are copied to a list in the order
+            the agents were added and shuffled with `model.random.shuffle`,
+            exactly as `BaseScheduler.agent_buffer` does.
+        "numpy": the agent ids are kept in a reusable int64 array that is
+            shuffled in place with `model.np_random.shuffle`. The array is
+            refilled, in the order the agents were added, only after agents
+            were added or removed; otherwise the previous order is shuffled
+            again. Requires integer unique_ids.
+    Both are reproducible for a fixed model seed, since `model.np_random` is
+    seeded from the same seed as `model.random`, but they give different
+    orders. The numpy mode draws nothing from `model.random`, so draws the
+    agents make from it are shifted too; a seeded run therefore only repeats
+    with the same mode.
+
+    In numpy mode the shuffled ids are turned into agents `block_size` at a
+    time instead of all at once, which bounds the extra memory of a step with
+    many agents.
     """
 
+    def __init__(
+        self,
+        model: Model,
+        deferred: bool = False,
+        shuffle_rng: str = "random",
+        block_size: int | None = 65536,
+    ) -> None:
+        """
+        Args:
+            model: Model object associated with the schedule.
+            deferred: If True, queue additions and removals made during a step
+                      and commit them at the end of the step.
+            shuffle_rng: "random" or "numpy", the generator the activation
+                         order is drawn from.
+            block_size: Number of shuffled ids to resolve to agents at a time
+                        in "numpy" mode, 65536 by default; None resolves all
+                        of them at once.
+        """
+        super().__init__(model, deferred)
+        if shuffle_rng not in ("random", "numpy"):
+            raise Exception(
+                f"Unknown shuffle_rng {shuffle_rng!r}, use 'random' or 'numpy'"
+            )
+        if block_size is not None and block_size < 1:
+            raise Exception("block_size must be at least 1")
+        self.shuffle_rng = shuffle_rng
+        self.block_size = block_size
+        self._id_buffer = np.empty(0, dtype=np.int64)
+        self._ids_changed = True
+
+    def _add(self, agent: Agent) -> None:
+        super()._add(agent)
+        self._ids_changed = True
+
+    def _remove(self, agent: Agent) -> None:
+        super()._remove(agent)
+        self._ids_changed = True
+
+    def _shuffled_ids(self) -> np.ndarray:
+        """Shuffle the id array in place and return it."""
+        n = len(self._agents)
+        if self._ids_changed:
+            if len(self._id_buffer) < n:
+                self._id_buffer = np.empty(
+                    max(n, 2 * len(self._id_buffer)), dtype=np.int64
+                )
+            try:
+                self._id_buffer[:n] = np.fromiter(
+                    self._agents.keys(), dtype=np.int64, count=n
+                )
+            except (TypeError, ValueError, OverflowError):
+                raise Exception("shuffle_rng='numpy' requires integer agent unique_ids")
+            self._ids_changed = False
+        ids = self._id_buffer[:n]
+        self.model.np_random.shuffle(ids)
+        return ids
+
+    def agent_buffer(self, shuffled: bool = False) -> Iterator[Agent]:
+        """Yield the agents, in the order drawn by the numpy generator if
+        `shuffle_rng` is "numpy"; see `BaseScheduler.agent_buffer`.
+        """
+        if not shuffled or self.shuffle_rng == "random":
+            yield from super().agent_buffer(shuffled)
+            return
+
+        ids = self._shuffled_ids()
+        if self.block_size is None:
+            blocks = [ids]
+        else:
+            blocks = (
+                ids[start : start + self.block_size]
+                for start in range(0, len(ids), self.block_size)
+            )
+        agents = self._agents
+        removed = self._pending_remove
+        for block in blocks:
+            for agent_key in block.tolist():
+                agent = agents.get(agent_key)
+                if agent is not None and (not removed or agent_key not in removed):
+                    yield agent
+
     def step(self) -> None:
         """Executes the step of all agents, one at a time, in
         random order.
         """
-        for agent in self.agent_buffer(shuffled=True):
-            agent.step()
+        with self._deferring_changes():
+            for agent in self.agent_buffer(shuffled=True):
+                agent.step()
         self.steps += 1
         self.time += 1
 
@@ -138,16 +336,19 @@ class SimultaneousActivation(BaseScheduler):
 
     def step(self) -> None:
         """Step all agents, then advance them."""
-        # To be able to remove and/or add agents during stepping
-        # it's necessary to cast the keys view to a list.
-        agent_keys = list(self._agents.keys())
-        for agent_key in agent_keys:
-            self._agents[agent_key].step()
-        # We recompute the keys because some agents might have been removed in
-        # the previous loop.
-        agent_keys = list(self._agents.keys())
-        for agent_key in agent_keys:
-            self._agents[agent_key].advance()
+        with self._deferring_changes():
+            # To be able to remove and/or add agents during stepping
+            # it's necessary to cast the keys view to a list.
+            agent_keys = list(self._agents.keys())
+            for agent_key in agent_keys:
+                if agent_key in self._agents and agent_key not in self._pending_remove:
+                    self._agents[agent_key].step()
+            # We recompute the keys because some agents might have been removed in
+            # the previous loop.
+            agent_keys = list(self._agents.keys())
+            for agent_key in agent_keys:
+                if agent_key in self._agents and agent_key not in self._pending_remove:
+                    self._agents[agent_key].advance()
         self.steps += 1
         self.time += 1
 
@@ -165,11 +366,12 @@ class StagedActivation(BaseScheduler):
     """
 
     def __init__(
-            self,
-            model: Model,
-            stage_list: list[str] | None = None,
-            shuffle: bool = False,
-            shuffle_between_stages: bool = False,
+        self,
+        model: Model,
+        stage_list: list[str] | None = None,
+        shuffle: bool = False,
+        shuffle_between_stages: bool = False,
+        deferred: bool = False,
     ) -> None:
         """Create an empty Staged Activation schedule.
 
@@ -181,8 +383,10 @@ class StagedActivation(BaseScheduler):
             shuffle_between_stages: If True, shuffle the agents after each
                                     stage; otherwise, only shuffle at the start
                                     of each step.
+            deferred: If True, queue additions and removals made during a step
+                      and commit them at the end of the step.
         """
-        super().__init__(model)
+        super().__init__(model, deferred)
         self.stage_list = ["step"] if not stage_list else stage_list
         self.shuffle = shuffle
         self.shuffle_between_stages = shuffle_between_stages
@@ -190,21 +394,25 @@ class StagedActivation(BaseScheduler):
 
     def step(self) -> None:
         """Executes all the stages for all agents."""
-        # To be able to remove and/or add agents during stepping
-        # it's necessary to cast the keys view to a list.
-        agent_keys = list(self._agents.keys())
-        if self.shuffle:
-            self.model.random.shuffle(agent_keys)
-        for stage in self.stage_list:
-            for agent_key in agent_keys:
-                if agent_key in self._agents:
-                    getattr(self._agents[agent_key], stage)()  # Run stage
-            # We recompute the keys because some agents might have been removed
-            # in the previous loop.
+        with self._deferring_changes():
+            # To be able to remove and/or add agents during stepping
+            # it's necessary to cast the keys view to a list.
             agent_keys = list(self._agents.keys())
-            if self.shuffle_between_stages:
+            if self.shuffle:
                 self.model.random.shuffle(agent_keys)
-            self.time += self.stage_time
+            for stage in self.stage_list:
+                for agent_key in agent_keys:
+                    if (
+                        agent_key in self._agents
+                        and agent_key not in self._pending_remove
+                    ):
+                        getattr(self._agents[agent_key], stage)()  # Run stage
+                # We recompute the keys because some agents might have been removed
+                # in the previous loop.
+                agent_keys = list(self._agents.keys())
+                if self.shuffle_between_stages:
+                    self.model.random.shuffle(agent_keys)
+                self.time += self.stage_time
 
         self.steps += 1
 
@@ -229,22 +437,22 @@ class RandomActivationByType(BaseScheduler):
     - access via `your_model.scheduler.agents_by_type[your_type_class]`
     """
 
-    def __init__(self, model: Model) -> None:
-        super().__init__(model)
+    def __init__(self, model: Model, deferred: bool = False) -> None:
+        super().__init__(model, deferred)
         self.agents_by_type = defaultdict(dict)
 
-    def add(self, agent: Agent) -> None:
+    def _add(self, agent: Agent) -> None:
         """
         Add an Agent object to the schedule
 
         Args:
             agent: An Agent to be added to the schedule.
         """
-        super().add(agent)
+        super()._add(agent)
         agent_class: type[Agent] = type(agent)
         self.agents_by_type[agent_class][agent.unique_id] = agent
 
-    def remove(self, agent: Agent) -> None:
+    def _remove(self, agent: Agent) -> None:
         """
         Remove all instances of a given agent from the schedule.
         """
@@ -263,15 +471,14 @@ class RandomActivationByType(BaseScheduler):
             shuffle_agents: If True, the order of execution of each agents in a
                             type group is shuffled.
         """
-        # To be able to remove and/or add agents during stepping
-        # it's necessary to cast the keys view to a list.
-        type_keys: list[type[Agent]] = list(self.agents_by_type.keys())
-        if shuffle_types:
-            self.model.random.shuffle(type_keys)
-        for agent_class in type_keys:
-            self.step_type(agent_class, shuffle_agents=shuffle_agents)
-            print("agent_type")
-            print(agent_class)
+        with self._deferring_changes():
+            # To be able to remove and/or add agents during stepping
+            # it's necessary to cast the keys view to a list.
+            type_keys: list[type[Agent]] = list(self.agents_by_type.keys())
+            if shuffle_types:
+                self.model.random.shuffle(type_keys)
+            for agent_class in type_keys:
+                self.step_type(agent_class, shuffle_agents=shuffle_agents)
         self.steps += 1
         self.time += 1
 
@@ -282,6 +489,13 @@ class RandomActivationByType(BaseScheduler):
         Args:
             type_class: Class object of the type to run.
         """
+        if self._deferring:
+            for agent in self._snapshot_buffer(
+                self.agents_by_type[type_class], shuffle_agents
+            ):
+                agent.step()
+            return
+
         agent_keys: list[int] = list(self.agents_by_type[type_class].keys())
         if shuffle_agents:
             self.model.random.shuffle(agent_keys)
@@ -294,3 +508,62 @@ class RandomActivationByType(BaseScheduler):
         Returns the current number of agents of certain type in the queue.
         """
         return len(self.agents_by_type[type_class])
+
+
+class TypeStagedActivation(RandomActivationByType):
+    """
+    A RandomActivationByType that can activate all agents of a type with a
+    single call.
+
+    If the schedule is created with `vectorized=True` and an agent class
+    defines a class method `step_vectorized(agents)`, the agents of that type
+    are activated by calling it once with the list of those agents, in the
+    order they were added; the method is responsible for any randomness, e.g.
+    by drawing from `model.np_random` for all agents at once. Other types,
+    and all types by default, fall back to calling step() on each agent, as
+    `RandomActivationByType` does.
+
+    Example:
+    >>> class Sheep(Agent):
+    ...     @classmethod
+    ...     def step_vectorized(cls, agents):
+    ...         ...
+    """
+
+    def __init__(
+        self, model: Model, deferred: bool = False, vectorized: bool = False
+    ) -> None:
+        """
+        Args:
+            model: Model object associated with the schedule.
+            deferred: If True, queue additions and removals made during a step
+                      and commit them at the end of the step.
+            vectorized: If True, activate the agents of types with a
+                        `step_vectorized` class method with a single call to
+                        it; by default every agent is stepped individually.
+        """
+        super().__init__(model, deferred)
+        self.vectorized = vectorized
+
+    def step_type(self, type_class: type[Agent], shuffle_agents: bool = True) -> None:
+        """
+        Run all agents of a given type, with the vectorized step of the type
+        if it has one.
+
+        Args:
+            type_class: Class object of the type to run.
+            shuffle_agents: If True, and the type has no vectorized step, the
+                            agents are stepped in random order.
+        """
+        step_vectorized = (
+            getattr(type_class, "step_vectorized", None) if self.vectorized else None
+        )
+        if step_vectorized is None:
+            super().step_type(type_class, shuffle_agents=shuffle_agents)
+            return
+        agents = list(self.agents_by_type[type_class].values())
+        if self._pending_remove:
+            agents = [
+                agent for agent in agents if agent.unique_id not in self._pending_remove
+            ]
+        step_vectorized(agents)
@@ -5,6 +5,9 @@ Modular Canvas Rendering
 Module for visualizing model objects in grid cells.
 """
 from collections import defaultdict
+
+import numpy as np
+
 from mesa.visualization.ModularVisualization import VisualizationElement
 
 
@@ -93,14 +96,25 @@ class CanvasGrid(VisualizationElement):
 
     def render(self, model):
         grid_state = defaultdict(list)
-        for x in range(model.grid.width):
-            for y in range(model.grid.height):
-                cell_objects = model.grid.get_cell_list_contents([(x, y)])
-                for obj in cell_objects:
-                    portrayal = self.portrayal_method(obj)
-                    if portrayal:
-                        portrayal["x"] = x
-                        portrayal["y"] = y
-                        grid_state[portrayal["Layer"]].append(portrayal)
+        for x, y in self._iter_cells(model.grid):
+            cell_objects = model.grid.get_cell_list_contents([(x, y)])
+            for obj in cell_objects:
+                portrayal = self.portrayal_method(obj)
+                if portrayal:
+                    portrayal["x"] = x
+                    portrayal["y"] = y
+                    grid_state[portrayal["Layer"]].append(portrayal)
 
         return grid_state
+
+    @staticmethod
+    def _iter_cells(grid):
+        """Iterate over the cells to render, in (x, y) order. Grids that keep an
+        occupancy array only yield their occupied cells."""
+        if getattr(grid, "track_occupancy", False):
+            for x, y in np.argwhere(grid.occupancy > 0).tolist():
+                yield x, y
+        else:
+            for x in range(grid.width):
+                for y in range(grid.height):
+                    yield x, y
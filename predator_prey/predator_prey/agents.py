@@ -1,124 +1,261 @@
+import numpy as np
+
 import mesa
+from predator_prey.events import MOVE, EAT, BIRTH, DEATH, STARVED, EATEN, SPECIES_NAMES
 from predator_prey.random_walk import RandomWalker
+from predator_prey.scheduler import TrackedEnergy
 
 
 class Prey(RandomWalker):
     name = "prey"
+    species_id = SPECIES_NAMES.index(name)
+    energy = TrackedEnergy()
 
-    def __init__(self, unique_id, pos, model, moore, energy):
+    def __init__(self, unique_id, pos, model, moore, energy, parent_id=-1):
         super().__init__(unique_id, pos, model, moore=moore)
-        self.energy = energy
+        self._energy = energy
         self.age = 0
+        self.parent_id = parent_id
 
     def step(self):
         """
         A model step. Moves, ages, then eats grass or gets eaten or reproduce.
         """
-        if self.model.verbose_1:
-            print("-----------------------------------------------------------")
-            print("prey_" + str(self.unique_id) + " moves [E:" + str(round(self.energy, 1)) + "]: " + str(
-                self.pos) + "=>",
-                  end="")
-        self.random_move()
+        events = self.model.events
+        if not self.model.is_batched_move:
+            self.random_move()
         # Reduce energy because of step
         self.energy -= self.model.move_energy_prey
         self.age += 1
-        if self.model.verbose_1:
-            print(str(self.pos) + " [E:" + str(round(self.energy, 1)) + "]")
-
-        # If there is grass available in cell, eat it
-        agents_list_in_cell = self.model.grid.get_cell_list_contents([self.pos])
+        if events is not None:
+            events.record(
+                self.model.current_step(),
+                MOVE,
+                self.unique_id,
+                -1,
+                self.pos,
+                self.energy,
+                self.age,
+            )
 
         # Death or reproduction
         if self.energy < 0:
-            self.model.grid.remove_agent(self)
-            self.model.schedule.remove(self)
-            living = False
-            if self.model.verbose_2:
-                print("*   prey_" + str(self.unique_id) + " dies at age " + str(self.age) + " of starvation")
+            self.starve(events)
         else:
             # creation lottery
             if self.random.random() < self.model.prey_reproduce:
-                # Create a new prey:
-                new_energy_mother = self.energy / 2
-                new_energy_child = self.energy - new_energy_mother
-                created_id = self.model.next_id()
-                if self.model.verbose_3:
-                    print("prey_" + str(self.unique_id) + " creates prey_" + str(created_id) +
-                          " [E:" + str(round(new_energy_child, 1)) + "] at age " + str(self.age) +
-                          " [E:" + str(round(self.energy, 1)) + "]=>[E:" + str(round(new_energy_mother, 1)) + "]")
-                self.energy = new_energy_mother
-                created_prey = Prey(
-                    created_id, self.pos, self.model, self.moore, new_energy_child
+                self.reproduce(events)
+
+    @classmethod
+    def step_vectorized(cls, agents):
+        """
+        Steps all given prey at once, see mesa.time.TypeStagedActivation.
+
+        Moves and the creation lottery are drawn from the numpy generator of
+        the model for all prey together, and the energy update is done on an
+        array; otherwise every prey goes through the same phases as in step().
+        """
+        if not agents:
+            return
+        model = agents[0].model
+        events = model.events
+        rng = model.np_random
+        if not model.is_batched_move:
+            RandomWalker.batch_random_move(agents, model.grid, rng)
+        energy = np.fromiter(
+            (agent.energy for agent in agents), dtype=float, count=len(agents)
+        )
+        energy -= model.move_energy_prey
+        starved = energy < 0
+        reproduces = ~starved & (rng.random(len(agents)) < model.prey_reproduce)
+        for agent, new_energy, is_starved, is_reproducing in zip(
+            agents, energy.tolist(), starved.tolist(), reproduces.tolist()
+        ):
+            agent.energy = new_energy
+            agent.age += 1
+            if events is not None:
+                events.record(
+                    model.current_step(),
+                    MOVE,
+                    agent.unique_id,
+                    -1,
+                    agent.pos,
+                    agent.energy,
+                    agent.age,
                 )
-                self.model.grid.place_agent(created_prey, self.pos)
-                self.model.schedule.add(created_prey)
+            if is_starved:
+                agent.starve(events)
+            elif is_reproducing:
+                agent.reproduce(events)
+
+    def starve(self, events):
+        """
+        Removes the prey from the model after it ran out of energy.
+        """
+        if events is not None:
+            events.record(
+                self.model.current_step(),
+                DEATH,
+                self.unique_id,
+                -1,
+                self.pos,
+                self.energy,
+                self.age,
+            )
+        self.model.record_death(self, STARVED)
+        self.model.grid.remove_agent(self)
+        self.model.schedule.remove(self)
+
+    def reproduce(self, events):
+        """
+        Splits the energy of the prey with a new prey in the same cell.
+        """
+        new_energy_mother = self.energy / 2
+        new_energy_child = self.energy - new_energy_mother
+        created_id = self.model.next_id()
+        self.energy = new_energy_mother
+        created_prey = Prey(
+            created_id,
+            self.pos,
+            self.model,
+            self.moore,
+            new_energy_child,
+            parent_id=self.unique_id,
+        )
+        self.model.grid.place_agent(created_prey, self.pos)
+        self.model.schedule.add(created_prey)
+        self.model.record_birth(created_prey)
+        if events is not None:
+            events.record(
+                self.model.current_step(),
+                BIRTH,
+                created_id,
+                self.unique_id,
+                self.pos,
+                new_energy_child,
+                0,
+            )
 
 
 class Predator(RandomWalker):
     name = "predator"
+    species_id = SPECIES_NAMES.index(name)
+    energy = TrackedEnergy()
 
-    def __init__(self, unique_id, pos, model, moore, energy):
+    def __init__(self, unique_id, pos, model, moore, energy, parent_id=-1):
         super().__init__(unique_id, pos, model, moore=moore)
-        self.energy = energy
+        self._energy = energy
         self.age = 0
+        self.parent_id = parent_id
 
     def step(self):
-        if self.model.verbose_1:
-            print("-----------------------------------------------------------")
-            print("predator_" + str(self.unique_id) + " moves [E:" + str(round(self.energy, 1)) + "]: " + str(
-                self.pos) + "=>",
-                  end="")
-        self.random_move()
+        """
+        A model step. Moves, ages, eats a prey in its cell if there is one,
+        then starves or reproduces.
+        """
+        events = self.model.events
+        if not self.model.is_batched_move:
+            self.random_move()
         self.age += 1
         self.energy -= self.model.move_energy_prey
-        if self.model.verbose_1:
-            print(str(self.pos) + " [E:" + str(round(self.energy, 1)) + "]")
+        if events is not None:
+            events.record(
+                self.model.current_step(),
+                MOVE,
+                self.unique_id,
+                -1,
+                self.pos,
+                self.energy,
+                self.age,
+            )
 
         # If there are prey present, eat one at random
-        agents_list_in_cell = self.model.grid.get_cell_list_contents([self.pos])
-        prey_list_in_cell = [obj for obj in agents_list_in_cell if isinstance(obj, Prey)]
-        if len(prey_list_in_cell) > 0:  # if is_prey_list_in_cell
-            # eat random prey
-            prey_in_cell_to_eat = self.random.choice(prey_list_in_cell)
-            new_energy_predator = self.energy + prey_in_cell_to_eat.energy
-
-            if self.model.verbose_1:
-                print("predator_" + str(self.unique_id) + " eats prey_" + str(prey_in_cell_to_eat.unique_id) + " [E:" + str(round(self.energy, 1)) + "]=>[" + str(
-                    round(new_energy_predator, 1)) + "]")
-                print("prey_" + str(prey_in_cell_to_eat.unique_id) + " eaten " + str(
-                    prey_in_cell_to_eat.pos) + " [E:" + str(round(prey_in_cell_to_eat.energy, 1)) + "]=>", end="")
-
-            # Kill the prey
-            self.energy = new_energy_predator
-            self.model.grid.remove_agent(prey_in_cell_to_eat)
-            self.model.schedule.remove(prey_in_cell_to_eat)
-            if self.model.verbose_1:
-                print("killed and removed")
-            if self.model.verbose_2:
-                print("prey_" + str(prey_in_cell_to_eat.unique_id) + " dies at age " + str(prey_in_cell_to_eat.age) +
-                      " of being eaten by predator_" + str(self.unique_id))
+        prey_in_cell_to_eat = self.model.grid.random_cell_agent_of_type(
+            self.pos, Prey, self.random
+        )
+        if prey_in_cell_to_eat is not None:
+            self.eat(prey_in_cell_to_eat, events)
 
         # Death or reproduction
         if self.energy < 0:
-            self.model.grid.remove_agent(self)
-            self.model.schedule.remove(self)
-            if self.model.verbose_2:
-                print("*   predator_" + str(self.unique_id) + " dies at age " + str(self.age) + " of starvation")
+            self.starve(events)
         else:
             # creation lottery
             if self.random.random() < self.model.predator_reproduce:
-                # Create a new predator
-                new_energy_mother = self.energy / 2
-                new_energy_child = self.energy - new_energy_mother
-                created_id = self.model.next_id()
-                if self.model.verbose_3:
-                    print("predator_" + str(self.unique_id) + " creates predator_" + str(created_id) +
-                          " [E:" + str(round(new_energy_child, 1)) + "] at age " + str(self.age) +
-                          " [E:" + str(round(self.energy, 1)) + "]=>[E:" + str(round(new_energy_mother, 1)) + "]")
-                self.energy = new_energy_mother
-                created_predator = Predator(
-                    created_id, self.pos, self.model, self.moore, new_energy_child
-                )
-                self.model.grid.place_agent(created_predator, self.pos)
-                self.model.schedule.add(created_predator)
+                self.reproduce(events)
+
+    def eat(self, prey, events):
+        """
+        Takes over the energy of a prey and removes the prey from the model.
+        """
+        self.energy = self.energy + prey.energy
+        if events is not None:
+            events.record(
+                self.model.current_step(),
+                EAT,
+                self.unique_id,
+                prey.unique_id,
+                self.pos,
+                self.energy,
+                self.age,
+            )
+            events.record(
+                self.model.current_step(),
+                DEATH,
+                prey.unique_id,
+                self.unique_id,
+                prey.pos,
+                prey.energy,
+                prey.age,
+            )
+        self.model.record_death(prey, EATEN, self.unique_id)
+        self.model.grid.remove_agent(prey)
+        self.model.schedule.remove(prey)
+
+    def starve(self, events):
+        """
+        Removes the predator from the model after it ran out of energy.
+        """
+        if events is not None:
+            events.record(
+                self.model.current_step(),
+                DEATH,
+                self.unique_id,
+                -1,
+                self.pos,
+                self.energy,
+                self.age,
+            )
+        self.model.record_death(self, STARVED)
+        self.model.grid.remove_agent(self)
+        self.model.schedule.remove(self)
+
+    def reproduce(self, events):
+        """
+        Splits the energy of the predator with a new predator in the same cell.
+        """
+        new_energy_mother = self.energy / 2
+        new_energy_child = self.energy - new_energy_mother
+        created_id = self.model.next_id()
+        self.energy = new_energy_mother
+        created_predator = Predator(
+            created_id,
+            self.pos,
+            self.model,
+            self.moore,
+            new_energy_child,
+            parent_id=self.unique_id,
+        )
+        self.model.grid.place_agent(created_predator, self.pos)
+        self.model.schedule.add(created_predator)
+        self.model.record_birth(created_predator)
+        if events is not None:
+            events.record(
+                self.model.current_step(),
+                BIRTH,
+                created_id,
+                self.unique_id,
+                self.pos,
+                new_energy_child,
+                0,
+            )
@@ -0,0 +1,215 @@
+"""
+Agent lifecycle event stream
+============================
+
+Structured replacement for printing agent activity. Agents report move, eat,
+birth and death events to the `EventLog` of the model, which stores them in
+preallocated NumPy columns. Logging is off by default: the model then has no
+event log and agents skip all event work after a single `None` check.
+
+With a `path`, a full buffer is appended to that CSV file in one bulk write and
+then reused, so arbitrarily long traces can be kept at constant memory.
+Without a path the buffer is a ring that keeps the most recent `capacity`
+events.
+
+`LifecycleTable` is a growable columnar table the model records every birth
+and death in, for lifespan and cause-of-death analyses.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+MOVE = 0
+EAT = 1
+BIRTH = 2
+DEATH = 3
+
+EVENT_NAMES = ("move", "eat", "birth", "death")
+
+BORN = 0
+STARVED = 1
+EATEN = 2
+
+CAUSE_NAMES = ("born", "starved", "eaten")
+SPECIES_NAMES = ("predator", "prey")
+
+
+class EventLog:
+    """
+    Columnar buffer of agent events.
+
+    Every event has the columns:
+        step: Step during which the event happened, counting from 1, see
+            PredatorPrey.current_step.
+        event: One of MOVE, EAT, BIRTH, DEATH.
+        agent_id: The agent that moves, eats, is born or dies.
+        other_id: The prey eaten (EAT), the parent (BIRTH), the predator that
+            ate the agent (DEATH by predation), or -1.
+        x, y: Position of the agent.
+        energy: Energy of the agent after the event.
+        age: Age of the agent.
+    """
+
+    columns = (
+        ("step", np.int64),
+        ("event", np.int8),
+        ("agent_id", np.int64),
+        ("other_id", np.int64),
+        ("x", np.int32),
+        ("y", np.int32),
+        ("energy", np.float64),
+        ("age", np.int64),
+    )
+
+    def __init__(self, capacity: int = 65536, path: str = None) -> None:
+        """
+        Args:
+            capacity: Number of events held in memory.
+            path: CSV file that full buffers are appended to; if None, the
+                oldest events are overwritten once the buffer is full.
+        """
+        self.capacity = capacity
+        self.path = path
+        self._data = {
+            name: np.empty(capacity, dtype=dtype) for name, dtype in self.columns
+        }
+        self._next = 0  # index the next event is written to
+        self._size = 0  # number of valid events in the buffer
+        self.total = 0  # number of events recorded since creation
+
+    def __len__(self) -> int:
+        return self._size
+
+    def record(self, step, event, agent_id, other_id, pos, energy, age) -> None:
+        """
+        Append one event.
+        """
+        i = self._next
+        data = self._data
+        data["step"][i] = step
+        data["event"][i] = event
+        data["agent_id"][i] = agent_id
+        data["other_id"][i] = other_id
+        data["x"][i], data["y"][i] = pos
+        data["energy"][i] = energy
+        data["age"][i] = age
+        self.total += 1
+        self._next = i + 1
+        if self._size < self.capacity:
+            self._size += 1
+        if self._next == self.capacity:
+            if self.path is not None:
+                self.flush()
+            else:
+                self._next = 0
+
+    def _ordered(self, name: str) -> np.ndarray:
+        """Returns the valid entries of a column, oldest first."""
+        column = self._data[name]
+        if self._size < self.capacity or self._next == 0:
+            return column[: self._size]
+        return np.concatenate((column[self._next :], column[: self._next]))
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Returns the buffered events as a DataFrame, oldest first, with the
+        event type spelled out.
+        """
+        df = pd.DataFrame({name: self._ordered(name) for name, _ in self.columns})
+        df["event"] = pd.Categorical.from_codes(df["event"], categories=EVENT_NAMES)
+        return df
+
+    def flush(self, path: str = None) -> None:
+        """
+        Append the buffered events to a CSV file in one write and empty the
+        buffer.
+
+        Args:
+            path: File to append to, by default the path of the log.
+        """
+        path = self.path if path is None else path
+        if path is None:
+            raise ValueError("No path to flush the event log to.")
+        if self._size:
+            header = not os.path.exists(path) or os.path.getsize(path) == 0
+            self.to_dataframe().to_csv(path, mode="a", header=header, index=False)
+        self._next = 0
+        self._size = 0
+
+
+class LifecycleTable:
+    """
+    Growable columnar table of births and deaths.
+
+    Every row has the columns:
+        step: Step during which the agent is born or dies, counting from 1,
+            see PredatorPrey.current_step; agents created with the model are
+            born at step 0.
+        agent_id: The agent that is born or dies.
+        parent_id: Parent of the agent, -1 for agents created with the model.
+        species: Index into SPECIES_NAMES.
+        age: Age of the agent.
+        energy: Energy of the agent at birth or death.
+        cause: One of BORN, STARVED, EATEN.
+        predator_id: The predator that ate the agent, otherwise -1.
+
+    Columns are NumPy arrays that double in size when full, so appending a row
+    is amortized O(1).
+    """
+
+    columns = (
+        ("step", np.int64),
+        ("agent_id", np.int64),
+        ("parent_id", np.int64),
+        ("species", np.int8),
+        ("age", np.int64),
+        ("energy", np.float64),
+        ("cause", np.int8),
+        ("predator_id", np.int64),
+    )
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self._data = {
+            name: np.empty(capacity, dtype=dtype) for name, dtype in self.columns
+        }
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(
+        self, step, agent_id, parent_id, species, age, energy, cause, predator_id=-1
+    ) -> None:
+        """
+        Append one row.
+        """
+        i = self._size
+        data = self._data
+        if i == len(data["step"]):
+            for name, column in data.items():
+                grown = np.empty(max(2 * len(column), 1), dtype=column.dtype)
+                grown[:i] = column
+                data[name] = grown
+        data["step"][i] = step
+        data["agent_id"][i] = agent_id
+        data["parent_id"][i] = parent_id
+        data["species"][i] = species
+        data["age"][i] = age
+        data["energy"][i] = energy
+        data["cause"][i] = cause
+        data["predator_id"][i] = predator_id
+        self._size = i + 1
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Returns the table as a DataFrame, with species and cause spelled out.
+        """
+        df = pd.DataFrame(
+            {name: self._data[name][: self._size] for name, _ in self.columns}
+        )
+        df["species"] = pd.Categorical.from_codes(
+            df["species"], categories=SPECIES_NAMES
+        )
+        df["cause"] = pd.Categorical.from_codes(df["cause"], categories=CAUSE_NAMES)
+        return df
@@ -2,12 +2,22 @@
 Predator-Moving-Prey Model
 
 """
+import os
+import shutil
+import tempfile
+import weakref
+from typing import Callable, List, Type
 
 import mesa
 
-from predator_prey.scheduler import RandomActivationByTypeFiltered, RandomActivationByAllAgents
+from predator_prey.scheduler import (
+    RandomActivationByTypeFiltered,
+    RandomActivationByAllAgents,
+)
 
 from predator_prey.agents import Prey, Predator
+from predator_prey.events import EventLog, LifecycleTable, BORN
+from predator_prey.random_walk import RandomWalker
 
 
 class PredatorPrey(mesa.Model):
@@ -27,34 +37,103 @@ class PredatorPrey(mesa.Model):
     move_energy_prey = 0.0
     prey_reproduce = 0.0
 
-    verbose_0 = True  # agent count
-    verbose_1 = True  # agent_id activation move and eat
-    verbose_2 = True  # agent death
-    verbose_3 = True  # agent birth
     verbose_6 = False  # table agent count and cumulative energy per type
 
+    log_events = False
+    """
+    If True, agents record their moves, meals, births and deaths in
+    `self.events`, see predator_prey.events; otherwise `self.events` is None
+    and no event work is done
+    """
+    event_log_capacity = 65536
+    event_log_path = None
+    """
+    CSV file the event buffer is flushed to whenever it is full, and when the
+    run ends: when the model stops, is closed (`close`, which
+    mesa.batch_run calls), or is garbage collected
+    """
+
+    record_lifecycle = False
+    """
+    If True, every birth and death is recorded in `self.lifecycle`, see
+    `get_lifecycle_dataframe`; otherwise `self.lifecycle` is None
+    """
+
     is_per_type_random_activated = False
     """
     False: agent are all random activated regardless of type,
     if True agents are random per agent type and random per class
     """
-    description = (
-        "A model for simulating Predator-Prey behavior."
-    )
+    is_batched_move = False
+    """
+    False: every agent moves at the start of its own activation,
+    if True all agents move at once at the start of the step, drawn from the
+    numpy generator of the model, before any agent is activated
+    """
+    is_deferred_scheduling = False
+    """
+    False: births and deaths change the schedule immediately,
+    if True they are queued and committed at the end of the step, and agents
+    are activated from a snapshot of the schedule
+    """
+    is_type_vectorized = False
+    """
+    False: with per type activation every agent is stepped on its own,
+    if True species with a vectorized step (Prey) are stepped in one call,
+    drawing from the numpy generator of the model
+    """
+    collection_schedule = None
+    """
+    Steps at which the data collector collects, see
+    mesa.DataCollector.set_collection_schedule: None for every step, an int k
+    for every k steps, "end" for the final step only, or a list of steps,
+    e.g. from mesa.datacollection.log_spaced_steps; the final step of a run
+    is always collected
+    """
+    collect_agent_vars = False
+    """
+    If True, the data collector also records the species, energy and age of
+    every agent at each collected step, see
+    mesa.DataCollector.get_agent_vars_dataframe
+    """
+    agent_keyframe_every = None
+    """
+    If set with collect_agent_vars, the agent records of only every so many
+    collections are stored in full, and the others as the changes since the
+    previous collection, see mesa.DataCollector.get_agent_vars_at
+    """
+    spill_dir = None
+    """
+    Parent directory the data collector spills its data to every 1000
+    collections, keeping only the latest 100 in memory, see
+    mesa.DataCollector; every model spills into a new subdirectory of its own,
+    `self.datacollector.spill_dir`, which is removed when the model is closed
+    (`close`, which mesa.batch_run calls) or garbage collected; call
+    `self.datacollector.load_history()` before to keep the spilled data. By
+    default all data stays in memory
+    """
+    activation_rng = "random"
+    """
+    "random": the activation order is shuffled with the python generator of
+    the model, "numpy": with its numpy generator (faster for many agents, but
+    a different sequence for the same seed), see mesa.time.RandomActivation;
+    ignored when is_per_type_random_activated
+    """
+    description = "A model for simulating Predator-Prey behavior."
 
     def __init__(
-            self,
-            n_grid_cells_width=n_grid_cells_width,
-            n_grid_cells_height=n_grid_cells_height,
-            initial_prey=initial_prey,
-            initial_predators=initial_predators,
-            prey_reproduce=prey_reproduce,
-            predator_reproduce=predator_reproduce,
-            initial_energy_predators=initial_energy_predators,
-            initial_energy_prey=initial_energy_prey,
-            move_energy_predators=move_energy_predators,
-            move_energy_prey=move_energy_prey,
-
+        self,
+        n_grid_cells_width=n_grid_cells_width,
+        n_grid_cells_height=n_grid_cells_height,
+        initial_prey=initial_prey,
+        initial_predators=initial_predators,
+        prey_reproduce=prey_reproduce,
+        predator_reproduce=predator_reproduce,
+        initial_energy_predators=initial_energy_predators,
+        initial_energy_prey=initial_energy_prey,
+        move_energy_predators=move_energy_predators,
+        move_energy_prey=move_energy_prey,
+        seed=None,
     ):
         """
         Create a new Predator-Prey model with the given parameters.
@@ -64,6 +143,7 @@ class PredatorPrey(mesa.Model):
             initial_predators: Number of predators to start with
             prey_reproduce: Probability of each prey reproducing each step
             predator_reproduce: Probability of each predator reproducing each step
+            seed: Seed for the random number generator of the model
         """
         super().__init__()
         # Set parameters
@@ -79,9 +159,34 @@ class PredatorPrey(mesa.Model):
         self.initial_energy_prey = initial_energy_prey
         self.move_energy_predators = move_energy_predators
         self.move_energy_prey = move_energy_prey
-        self.schedule = RandomActivationByTypeFiltered(self) if self.is_per_type_random_activated else \
-            RandomActivationByAllAgents(self)
-        self.grid = mesa.space.MultiGrid(self.n_grid_cells_width, self.n_grid_cells_height, torus=True)
+        self.events = (
+            EventLog(self.event_log_capacity, self.event_log_path)
+            if self.log_events
+            else None
+        )
+        if self.events is not None and self.events.path is not None:
+            # Holds the log, not the model, so it runs when the model is
+            # garbage collected, or at exit
+            weakref.finalize(self, self.events.flush)
+        self.lifecycle = LifecycleTable() if self.record_lifecycle else None
+        self.schedule = (
+            RandomActivationByTypeFiltered(
+                self, self.is_deferred_scheduling, self.is_type_vectorized
+            )
+            if self.is_per_type_random_activated
+            else RandomActivationByAllAgents(
+                self, self.is_deferred_scheduling, self.activation_rng
+            )
+        )
+        self.grid = mesa.space.MultiGrid(
+            self.n_grid_cells_width,
+            self.n_grid_cells_height,
+            torus=True,
+            track_types=True,
+        )
+        spill_dir = self._new_spill_dir()
+        if spill_dir is not None:
+            weakref.finalize(self, shutil.rmtree, spill_dir, ignore_errors=True)
         self.datacollector = mesa.DataCollector(
             model_reporters={
                 "Predators": lambda m: m.schedule.get_type_count(Predator),
@@ -89,6 +194,16 @@ class PredatorPrey(mesa.Model):
                 "Predators_energy": lambda m: m.schedule.get_energy_count(Predator),
                 "Prey_energy": lambda m: m.schedule.get_energy_count(Prey),
             },
+            agent_reporters={
+                "Species": "species_id",
+                "Energy": "energy",
+                "Age": "age",
+            }
+            if self.collect_agent_vars
+            else None,
+            collection_schedule=self.collection_schedule,
+            spill_dir=spill_dir,
+            agent_keyframe_every=self.agent_keyframe_every,
         )
 
         # Create predators
@@ -99,6 +214,7 @@ class PredatorPrey(mesa.Model):
             predator = Predator(self.next_id(), (x, y), self, True, energy)
             self.grid.place_agent(predator, (x, y))
             self.schedule.add(predator)
+            self.record_birth(predator, step=0)
 
         # Create prey:
         for i in range(self.initial_prey):
@@ -108,11 +224,125 @@ class PredatorPrey(mesa.Model):
             prey = Prey(self.next_id(), (x, y), self, True, energy)
             self.grid.place_agent(prey, (x, y))
             self.schedule.add(prey)
+            self.record_birth(prey, step=0)
+
+        # Stop conditions are checked after every step; the simulation stops as
+        # soon as one of them holds. By default a run stops when either species
+        # has died out.
+        self.stop_conditions: List[Callable[[PredatorPrey], bool]] = [
+            lambda m: m.is_extinct(Predator),
+            lambda m: m.is_extinct(Prey),
+        ]
 
         self.running = True
         self.datacollector.collect(self)
 
+    def _new_spill_dir(self):
+        """
+        Returns a new subdirectory of spill_dir for this model to spill
+        into, or None if spilling is off.
+        """
+        if self.spill_dir is None:
+            return None
+        os.makedirs(self.spill_dir, exist_ok=True)
+        return tempfile.mkdtemp(prefix="run-", dir=self.spill_dir)
+
+    def is_extinct(self, type_class: Type[mesa.Agent]) -> bool:
+        """
+        Returns True if no agent of the given type is left in the schedule.
+        """
+        return self.schedule.get_type_count(type_class) == 0
+
+    def add_stop_condition(self, condition: Callable[["PredatorPrey"], bool]) -> None:
+        """
+        Add a condition that stops the simulation when it returns True.
+
+        Args:
+            condition: Function that takes the model and returns a bool. It is
+                evaluated once per step, so it should be cheap, e.g. read
+                the live counters of the scheduler.
+        """
+        self.stop_conditions.append(condition)
+
+    def should_stop(self) -> bool:
+        """
+        Returns True if any of the stop conditions holds.
+        """
+        return any(condition(self) for condition in self.stop_conditions)
+
+    def current_step(self) -> int:
+        """
+        Returns the number of the step in progress, counting from 1; the
+        schedule only counts a step in `schedule.steps` once it is done.
+        """
+        return self.schedule.steps + 1
+
+    def record_birth(self, agent, step: int = None) -> None:
+        """
+        Record the birth of an agent in the lifecycle table.
+
+        Args:
+            agent: The agent that is born.
+            step: Step of the birth, by default the step in progress; 0 for
+                agents created with the model.
+        """
+        if self.lifecycle is not None:
+            step = self.current_step() if step is None else step
+            self.lifecycle.append(
+                step,
+                agent.unique_id,
+                agent.parent_id,
+                agent.species_id,
+                agent.age,
+                agent.energy,
+                BORN,
+            )
+
+    def record_death(self, agent, cause: int, predator_id: int = -1) -> None:
+        """
+        Record the death of an agent in the step in progress in the lifecycle
+        table.
+
+        Args:
+            agent: The agent that dies.
+            cause: predator_prey.events.STARVED or EATEN.
+            predator_id: The predator that ate the agent, if any.
+        """
+        if self.lifecycle is not None:
+            self.lifecycle.append(
+                self.current_step(),
+                agent.unique_id,
+                agent.parent_id,
+                agent.species_id,
+                agent.age,
+                agent.energy,
+                cause,
+                predator_id,
+            )
+
+    def get_lifecycle_dataframe(self):
+        """
+        Returns a DataFrame with a row for every birth and death, see
+        predator_prey.events.LifecycleTable for the columns.
+        """
+        if self.lifecycle is None:
+            raise Exception("The model does not record its lifecycle.")
+        return self.lifecycle.to_dataframe()
+
+    def close(self) -> None:
+        """
+        Ends the run: appends the events still buffered to event_log_path, and
+        removes the spill directory of the data collector.
+        """
+        if self.events is not None and self.events.path is not None:
+            self.events.flush()
+        self.datacollector.remove_spill()
+
     def step(self):
+        if self.is_batched_move:
+            RandomWalker.batch_random_move(
+                self.schedule.agents, self.grid, self.np_random
+            )
         self.schedule.step()
 
         # collect data
@@ -121,12 +351,17 @@ class PredatorPrey(mesa.Model):
             print(self.datacollector.get_model_vars_dataframe())
 
         if self.verbose_6:
-            print([self.schedule.time,
-                   self.schedule.get_type_count(Predator),
-                   self.schedule.get_type_count(Prey)])
-        df_predators = self.datacollector.get_model_vars_dataframe()["Predators"]
-        df_prey = self.datacollector.get_model_vars_dataframe()["Prey"]
-        if df_predators.iloc[-1] == 0 or df_prey.iloc[-1] == 0:
-            # https://stackoverflow.com/questions/34166030/obtaining-last-value-of-dataframe-column-without-index
+            print(
+                [
+                    self.schedule.time,
+                    self.schedule.get_type_count(Predator),
+                    self.schedule.get_type_count(Prey),
+                ]
+            )
+        if self.should_stop():
+            # stops simulation when one of the stop conditions holds,
+            # by default when either predators or prey are extinct
             self.running = False
-            # stops simulation when both agents are dead
+            self.datacollector.collect_final(self)
+            if self.events is not None and self.events.path is not None:
+                self.events.flush()
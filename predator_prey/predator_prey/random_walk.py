@@ -35,7 +35,21 @@ class RandomWalker(mesa.Agent):
         Step one cell in any allowable direction.
         """
         # Pick the next cell from the adjacent cells.
-        next_moves = self.model.grid.get_neighborhood(self.pos, self.moore, True)
-        next_move = self.random.choice(next_moves)
+        next_move = self.model.grid.random_neighborhood_cell(
+            self.pos, self.moore, True, self.random
+        )
         # Now move:
         self.model.grid.move_agent(self, next_move)
+
+    @staticmethod
+    def batch_random_move(walkers, grid, rng):
+        """
+        Step all walkers one cell in any allowable direction at once.
+
+        Batched counterpart of `random_move`: the directions of all walkers are
+        drawn together from the numpy generator `rng` and applied with a single
+        bulk move on the grid.
+        """
+        for moore in (True, False):
+            group = [walker for walker in walkers if walker.moore == moore]
+            grid.random_move_agents(group, moore, True, rng)
@@ -1,86 +1,259 @@
-from typing import Type, Callable
+import ast
+import functools
+import operator
+import re
+from typing import Type, Callable, Union
 from collections import defaultdict
 
+import numpy as np
+
 import mesa
 
+_COMPARISON = re.compile(r"^\s*([A-Za-z_]\w*)\s*(<=|>=|==|!=|<|>)\s*(.+?)\s*$")
+_OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+
 
-class RandomActivationByTypeFiltered(mesa.time.RandomActivationByType):
+@functools.lru_cache(maxsize=None)
+def compile_filter(expression: str) -> tuple:
     """
-    A scheduler that overrides the get_type_count method to allow for filtering
-    of agents by a function before counting.
+    Parses a declarative filter such as "energy > 10" or
+    "energy > 10 and age < 5" into a tuple of (attribute, operator, value)
+    comparisons that must all hold.
+    """
+    comparisons = []
+    for part in re.split(r"\s+and\s+", expression.strip()):
+        match = _COMPARISON.match(part)
+        if match is None:
+            raise ValueError(
+                f"Cannot parse filter {expression!r}; "
+                "expected e.g. 'energy > 10 and age < 5'"
+            )
+        attribute, symbol, value = match.groups()
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            raise ValueError(f"Cannot parse value {value!r} in filter {expression!r}")
+        comparisons.append((attribute, _OPERATORS[symbol], value))
+    return tuple(comparisons)
+
+
+class TrackedEnergy:
+    """
+    Descriptor for the energy of an agent that reports every change to the
+    schedule the agent is in, so the schedule can keep per-type energy sums.
 
     Example:
-    >>> scheduler = RandomActivationByTypeFiltered(model)
-    >>> scheduler.get_type_count(AgentA, lambda agent: agent.some_attribute > 10)
+    >>> class Sheep(mesa.Agent):
+    ...     energy = TrackedEnergy()
     """
 
+    def __get__(self, agent, owner=None):
+        if agent is None:
+            return self
+        return agent._energy
+
+    def __set__(self, agent, value) -> None:
+        schedule = getattr(agent, "_energy_schedule", None)
+        if schedule is not None:
+            # Two exact terms rather than their rounded difference
+            schedule.energy_changed(agent, -agent._energy)
+            schedule.energy_changed(agent, value)
+        agent._energy = value
+
+
+class EnergyTotalsMixin:
+    """
+    Keeps the sum of the energy of the agents per agent type up to date, so
+    reporters can read it in O(1).
+
+    Sums follow the agents added to and removed from the schedule, and every
+    change reported through `energy_changed`, which agents with a
+    `TrackedEnergy` attribute call automatically. The changes are added with
+    compensated (Neumaier) summation, which carries the rounding error of
+    every addition along, so a sum stays within rounding of the exact sum of
+    the energies however many changes it is built from. The sum of a type is
+    reset to exactly 0.0 whenever no agent of the type is left.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # Agent type -> [running sum, accumulated rounding error]
+        self._energy_by_type = defaultdict(lambda: [0.0, 0.0])
+
+    def _add(self, agent: mesa.Agent) -> None:
+        super()._add(agent)
+        self.energy_changed(agent, getattr(agent, "energy", 0.0))
+        if isinstance(getattr(type(agent), "energy", None), TrackedEnergy):
+            agent._energy_schedule = self
+
+    def _remove(self, agent: mesa.Agent) -> None:
+        super()._remove(agent)
+        self.energy_changed(agent, -getattr(agent, "energy", 0.0))
+        agent._energy_schedule = None
+
+    def energy_changed(self, agent: mesa.Agent, delta: float) -> None:
+        """
+        Adds the change in energy of a scheduled agent to the sum of its type.
+        """
+        total = self._energy_by_type[type(agent)]
+        value = total[0]
+        new = value + delta
+        if abs(value) >= abs(delta):
+            total[1] += (value - new) + delta
+        else:
+            total[1] += (delta - new) + value
+        total[0] = new
+
+    def get_energy_count(
+        self,
+        type_class: Type[mesa.Agent],
+    ) -> float:
+        """
+        Returns the total energy of the agents of certain type in the queue.
+        """
+        total = self._energy_by_type[type_class]
+        if not self.agents_by_type[type_class]:
+            total[0] = total[1] = 0.0
+        return total[0] + total[1]
+
+
+class FilteredCountMixin:
+    """
+    Provides get_type_count with an optional filter, given either as a
+    function of an agent or as a declarative expression such as
+    "energy > 10 and age < 5" (see `compile_filter`).
+
+    Declarative filters are evaluated with NumPy over per-type arrays of the
+    attributes they use. Those arrays and the resulting counts are memoized
+    until the schedule advances or agents are added or removed, so many
+    filtered counts per tick cost one pass over the agents per attribute.
+    Attribute changes made in between, e.g. during a step, are not seen.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self._count_cache = {}
+        self._attribute_arrays = {}
+        self._cache_step = None
+
+    def _add(self, agent: mesa.Agent) -> None:
+        super()._add(agent)
+        self._cache_step = None
+
+    def _remove(self, agent: mesa.Agent) -> None:
+        super()._remove(agent)
+        self._cache_step = None
+
     def get_type_count(
-            self,
-            type_class: Type[mesa.Agent],
-            filter_func: Callable[[mesa.Agent], bool] = None,
+        self,
+        type_class: Type[mesa.Agent],
+        filter_func: Union[Callable[[mesa.Agent], bool], str] = None,
     ) -> int:
         """
         Returns the current number of agents of certain type in the queue that satisfy the filter function.
+
+        Without a filter function the count is read from the live per-type
+        agent dict, so it costs O(1) instead of a scan over the agents.
         """
+        if filter_func is None:
+            return len(self.agents_by_type[type_class])
+        if isinstance(filter_func, str):
+            return self._count_matching(type_class, filter_func)
         count = 0
         for agent in self.agents_by_type[type_class].values():
-            if filter_func is None or filter_func(agent):
+            if filter_func(agent):
                 count += 1
         return count
 
+    def _count_matching(self, type_class: Type[mesa.Agent], expression: str) -> int:
+        """
+        Counts the agents of a type matching a declarative filter.
+        """
+        if self._cache_step != self.steps:
+            self._count_cache.clear()
+            self._attribute_arrays.clear()
+            self._cache_step = self.steps
+        key = (type_class, expression)
+        count = self._count_cache.get(key)
+        if count is None:
+            mask = np.ones(len(self.agents_by_type[type_class]), dtype=bool)
+            for attribute, compare, value in compile_filter(expression):
+                mask &= compare(self._attribute_array(type_class, attribute), value)
+            count = self._count_cache[key] = int(np.count_nonzero(mask))
+        return count
+
+    def _attribute_array(
+        self, type_class: Type[mesa.Agent], attribute: str
+    ) -> np.ndarray:
+        """
+        Returns the values of an attribute of all agents of a type as an array.
+        """
+        key = (type_class, attribute)
+        values = self._attribute_arrays.get(key)
+        if values is None:
+            agents = self.agents_by_type[type_class].values()
+            values = self._attribute_arrays[key] = np.array(
+                [getattr(agent, attribute) for agent in agents]
+            )
+        return values
+
 
-# pd: random activator mixing types and counting types
-class RandomActivationByAllAgents(mesa.time.RandomActivation):
+class RandomActivationByTypeFiltered(
+    FilteredCountMixin, EnergyTotalsMixin, mesa.time.TypeStagedActivation
+):
+    """
+    A scheduler that overrides the get_type_count method to allow for filtering
+    of agents by a function or a declarative expression before counting.
+
+    If the scheduler is created with vectorized=True, agent types with a
+    `step_vectorized` class method are activated with a single call to it,
+    see mesa.time.TypeStagedActivation; PredatorPrey opts in with its
+    `is_type_vectorized` flag.
 
-    def __init__(self, model: mesa.Model) -> None:
-        super().__init__(model)
+    Example:
+    >>> scheduler = RandomActivationByTypeFiltered(model)
+    >>> scheduler.get_type_count(AgentA, lambda agent: agent.some_attribute > 10)
+    >>> scheduler.get_type_count(AgentA, "some_attribute > 10")
+    """
+
+
+# pd: random activator mixing types and counting types
+class RandomActivationByAllAgents(
+    FilteredCountMixin, EnergyTotalsMixin, mesa.time.RandomActivation
+):
+    def __init__(
+        self,
+        model: mesa.Model,
+        deferred: bool = False,
+        shuffle_rng: str = "random",
+        block_size: int = 65536,
+    ) -> None:
+        super().__init__(model, deferred, shuffle_rng, block_size)
         self.agents_by_type = defaultdict(dict)
 
-    def add(self, agent: mesa.Agent) -> None:
+    def _add(self, agent: mesa.Agent) -> None:
         """
         Add an Agent object to the schedule
 
         Args:
             agent: An Agent to be added to the schedule.
         """
-        super().add(agent)
+        super()._add(agent)
         agent_class: type[mesa.Agent] = type(agent)
         self.agents_by_type[agent_class][agent.unique_id] = agent
 
-    def remove(self, agent: mesa.Agent) -> None:
+    def _remove(self, agent: mesa.Agent) -> None:
         """
         Remove all instances of a given agent from the schedule.
         """
-        del self._agents[agent.unique_id]
+        super()._remove(agent)
 
         agent_class: type[mesa.Agent] = type(agent)
         del self.agents_by_type[agent_class][agent.unique_id]
-
-    def get_type_count(
-            self,
-            type_class: Type[mesa.Agent],
-            filter_func: Callable[[mesa.Agent], bool] = None,
-    ) -> int:
-        """
-        Returns the current number of agents of certain type in the queue that satisfy the filter function.
-        """
-        count = 0
-        for agent in self.agents_by_type[type_class].values():
-            if filter_func is None or filter_func(agent):
-                count += 1
-        return count
-
-    def get_energy_count(
-            self,
-            type_class: Type[mesa.Agent],
-    ) -> float:
-        """
-        Returns the current number of agents of certain type in the queue that satisfy the filter function.
-        """
-        energy = 0
-        for agent in self.agents_by_type[type_class].values():
-            energy += agent.energy
-        return energy
-
-
-
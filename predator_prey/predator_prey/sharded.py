@@ -0,0 +1,364 @@
+"""
+Sharded Predator-Prey backend
+=============================
+
+Runs the vectorized backend (`vectorized.py`) on several processes by
+splitting the torus into `shards_x` x `shards_y` rectangular tiles. Every
+worker process owns the agents located in its tile and steps them with the
+phases of `PredatorPreyVectorized`.
+
+Exchange at tile borders:
+    Agents move at most one cell per tick, and all later phases (metabolism,
+    starvation, predation and reproduction) only involve agents of the same
+    cell. The halo of a tile is therefore the ring of cells right outside it,
+    and the only thing that crosses a border is an agent that moved into that
+    ring. A tick runs in two rounds:
+
+    1. Every worker moves its agents and returns the emigrants, those that
+       left the tile, with their ids, positions, energies and ages.
+    2. The coordinator hands every worker the immigrants of its tile, in
+       shard order, and the workers run the remaining phases and return their
+       totals for the data collector.
+
+Reproducibility:
+    Each worker draws from its own generator, spawned from the numpy
+    generator of the model, and children get ids from disjoint, interleaved
+    ranges per shard. A run is reproducible for a fixed seed and shard layout,
+    and with `processes=False` it gives the same results in a single process.
+    Different shard layouts give different (statistically equivalent) runs.
+"""
+import multiprocessing
+import weakref
+
+import numpy as np
+
+from predator_prey.vectorized import PredatorPreyVectorized, SpeciesArrays
+
+SPECIES = ("predators", "prey")
+
+
+class _Tile:
+    """
+    The agents of one tile, stepped with the phases of
+    `PredatorPreyVectorized`.
+
+    The phase methods of the model are reused as they are; they only need the
+    attributes the tile mirrors (grid size, energies, probabilities, move
+    offsets, `np_random`, `predators`, `prey` and `_next_ids`).
+    """
+
+    _move = PredatorPreyVectorized._move
+    _metabolize = PredatorPreyVectorized._metabolize
+    _starve = PredatorPreyVectorized._starve
+    _predate = PredatorPreyVectorized._predate
+    _reproduce = PredatorPreyVectorized._reproduce
+
+    def __init__(self, model, index, x_range, y_range, seed_sequence, first_id) -> None:
+        self.n_grid_cells_width = model.n_grid_cells_width
+        self.n_grid_cells_height = model.n_grid_cells_height
+        self.move_energy_prey = model.move_energy_prey
+        self.predator_reproduce = model.predator_reproduce
+        self.prey_reproduce = model.prey_reproduce
+        self._move_offsets = model._move_offsets
+        self.index = index
+        self.n_shards = model.n_shards
+        self.x_range = x_range
+        self.y_range = y_range
+        self.np_random = np.random.default_rng(seed_sequence)
+        self._first_id = first_id
+        self._ids_used = 0
+        for name in SPECIES:
+            source = getattr(model, name)
+            inside = self._inside(source.x, source.y)
+            species = SpeciesArrays(source.name, int(np.count_nonzero(inside)))
+            species.add(
+                source.unique_id[inside],
+                source.x[inside],
+                source.y[inside],
+                source.energy[inside],
+                source.age[inside],
+            )
+            setattr(self, name, species)
+
+    def _inside(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        (x0, x1), (y0, y1) = self.x_range, self.y_range
+        return (x >= x0) & (x < x1) & (y >= y0) & (y < y1)
+
+    def _next_ids(self, number: int) -> np.ndarray:
+        """Ids from the interleaved range of this shard."""
+        counter = np.arange(self._ids_used, self._ids_used + number, dtype=np.int64)
+        self._ids_used += number
+        return self._first_id + self.index + counter * self.n_shards
+
+    def move(self) -> dict:
+        """
+        Moves all agents and removes the ones that left the tile.
+
+        Returns:
+            Per species, a tuple (unique_id, x, y, energy, age) of arrays of
+            the emigrants.
+        """
+        emigrants = {}
+        for name in SPECIES:
+            species = getattr(self, name)
+            self._move(species)
+            leaving = ~self._inside(species.x, species.y)
+            emigrants[name] = tuple(
+                array[leaving].copy()
+                for array in (
+                    species.unique_id,
+                    species.x,
+                    species.y,
+                    species.energy,
+                    species.age,
+                )
+            )
+            species.alive[leaving] = False
+            species.compact()
+        return emigrants
+
+    def settle(self, immigrants: dict) -> tuple:
+        """
+        Adds the immigrants and runs the phases after the move.
+
+        Returns:
+            The totals of the tile after the tick, see `totals`.
+        """
+        for name in SPECIES:
+            species = getattr(self, name)
+            species.add(*immigrants[name])
+            self._metabolize(species)
+        self._starve(self.prey)
+        self._predate()
+        self._starve(self.predators)
+        self._reproduce(self.predators, self.predator_reproduce)
+        self._reproduce(self.prey, self.prey_reproduce)
+        self.predators.compact()
+        self.prey.compact()
+        return self.totals()
+
+    def totals(self) -> tuple:
+        """Returns the number of predators and prey, and their summed energies."""
+        return (
+            self.predators.count(),
+            self.prey.count(),
+            self.predators.energy_sum(),
+            self.prey.energy_sum(),
+        )
+
+    def gather(self) -> "_Tile":
+        """Returns the tile itself, to send it back from a worker."""
+        return self
+
+
+def _serve_tile(connection, tile: _Tile) -> None:
+    """Worker process loop: runs the tile methods the coordinator asks for."""
+    while True:
+        method, argument = connection.recv()
+        if method == "close":
+            break
+        connection.send(getattr(tile, method)(*argument))
+    connection.close()
+
+
+def _shut_down(connections: list, workers: list) -> None:
+    """Asks the workers to stop, closes their pipes and waits for them."""
+    for connection in connections:
+        try:
+            connection.send(("close", ()))
+        except OSError:
+            pass
+        connection.close()
+    for worker in workers:
+        worker.join()
+    connections.clear()
+    workers.clear()
+
+
+class _SpeciesTotals:
+    """Stands in for the `SpeciesArrays` of a species in the model reporters."""
+
+    def __init__(self) -> None:
+        self.number = 0
+        self.energy = 0.0
+
+    def count(self) -> int:
+        return self.number
+
+    def energy_sum(self) -> float:
+        return self.energy
+
+
+class PredatorPreySharded(PredatorPreyVectorized):
+    """
+    Predator-Prey model whose vectorized agents are split over tiles of the
+    torus, each stepped in a worker process. See the module docstring for the
+    border exchange and for reproducibility.
+
+    `self.predators` and `self.prey` only hold the totals of the last tick;
+    `gather()` collects the agents of all tiles. The workers are shut down by
+    `close()`, which is called when the model stops, by `mesa.batch_run` when
+    a run ends, and on leaving a `with` block; after that the tiles are
+    stepped in this process. A model that is dropped without being closed
+    shuts its workers down when it is garbage collected.
+    """
+
+    shards_x = 2
+    shards_y = 2
+
+    def __init__(
+        self, *args, shards_x=shards_x, shards_y=shards_y, processes=True, **kwargs
+    ):
+        """
+        Create a new sharded Predator-Prey model.
+
+        Args:
+            shards_x: Number of tiles along the width of the grid
+            shards_y: Number of tiles along the height of the grid
+            processes: If False, step the tiles one after the other in this
+                process instead of in worker processes
+
+        The other arguments are those of `PredatorPreyVectorized`.
+        """
+        super().__init__(*args, **kwargs)
+        if (
+            not 1 <= shards_x <= self.n_grid_cells_width
+            or not 1 <= shards_y <= self.n_grid_cells_height
+        ):
+            raise Exception("Every tile must contain at least one cell.")
+        self.shards_x = shards_x
+        self.shards_y = shards_y
+        self.n_shards = shards_x * shards_y
+        self._x_edges = np.linspace(0, self.n_grid_cells_width, shards_x + 1).astype(
+            np.int64
+        )
+        self._y_edges = np.linspace(0, self.n_grid_cells_height, shards_y + 1).astype(
+            np.int64
+        )
+
+        seed_sequences = np.random.SeedSequence(
+            int(self.np_random.integers(2**63))
+        ).spawn(self.n_shards)
+        first_id = self.current_id + 1
+        tiles = [
+            _Tile(
+                self,
+                index,
+                self._x_edges[index // shards_y : index // shards_y + 2].tolist(),
+                self._y_edges[index % shards_y : index % shards_y + 2].tolist(),
+                seed_sequences[index],
+                first_id,
+            )
+            for index in range(self.n_shards)
+        ]
+
+        self.predators = _SpeciesTotals()
+        self.prey = _SpeciesTotals()
+        self._set_totals(tile.totals() for tile in tiles)
+
+        self._tiles = None
+        self._workers = []
+        self._connections = []
+        if processes:
+            for tile in tiles:
+                connection, worker_connection = multiprocessing.Pipe()
+                worker = multiprocessing.Process(
+                    target=_serve_tile, args=(worker_connection, tile), daemon=True
+                )
+                worker.start()
+                worker_connection.close()
+                self._workers.append(worker)
+                self._connections.append(connection)
+        else:
+            self._tiles = tiles
+        # Holds the pipes and workers, not the model, so it runs when the
+        # model is garbage collected, or at exit
+        self._shut_down = weakref.finalize(
+            self, _shut_down, self._connections, self._workers
+        )
+
+    def __enter__(self) -> "PredatorPreySharded":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _call_tiles(self, method: str, arguments: list = None) -> list:
+        """Calls a tile method on every tile, in parallel if there are workers."""
+        arguments = arguments if arguments is not None else [()] * self.n_shards
+        if self._tiles is not None:
+            return [
+                getattr(tile, method)(*argument)
+                for tile, argument in zip(self._tiles, arguments)
+            ]
+        for connection, argument in zip(self._connections, arguments):
+            connection.send((method, argument))
+        return [connection.recv() for connection in self._connections]
+
+    def _tile_of(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Returns the index of the tile that contains each cell."""
+        column = np.searchsorted(self._x_edges, x, side="right") - 1
+        row = np.searchsorted(self._y_edges, y, side="right") - 1
+        return column * self.shards_y + row
+
+    def _route(self, emigrants: list) -> list:
+        """
+        Groups the emigrants of all tiles by the tile they moved into, keeping
+        them in shard order.
+        """
+        immigrants = [{} for _ in range(self.n_shards)]
+        for name in SPECIES:
+            columns = [
+                np.concatenate(arrays)
+                for arrays in zip(*(moved[name] for moved in emigrants))
+            ]
+            destination = self._tile_of(columns[1], columns[2])
+            for index in range(self.n_shards):
+                arriving = destination == index
+                immigrants[index][name] = tuple(column[arriving] for column in columns)
+        return immigrants
+
+    def _set_totals(self, totals) -> None:
+        self.predators.number = self.prey.number = 0
+        self.predators.energy = self.prey.energy = 0.0
+        for predators, prey, predators_energy, prey_energy in totals:
+            self.predators.number += predators
+            self.prey.number += prey
+            self.predators.energy += predators_energy
+            self.prey.energy += prey_energy
+
+    def gather(self) -> dict:
+        """
+        Returns the `SpeciesArrays` of all tiles merged per species, ordered
+        by tile.
+        """
+        tiles = self._tiles if self._tiles is not None else self._call_tiles("gather")
+        merged = {}
+        for name in SPECIES:
+            parts = [getattr(tile, name) for tile in tiles]
+            species = SpeciesArrays(parts[0].name, sum(part.n for part in parts))
+            for part in parts:
+                species.add(part.unique_id, part.x, part.y, part.energy, part.age)
+            merged[name] = species
+        return merged
+
+    def close(self) -> None:
+        """Brings the tiles back into this process and shuts down the workers."""
+        if self._tiles is None:
+            self._tiles = self._call_tiles("gather")
+        self._shut_down()
+
+    def step(self):
+        emigrants = self._call_tiles("move")
+        immigrants = self._route(emigrants)
+        self._set_totals(
+            self._call_tiles("settle", [(arriving,) for arriving in immigrants])
+        )
+        self.schedule.step()
+
+        # collect data
+        self.datacollector.collect(self)
+        if self.should_stop():
+            self.running = False
+            self.datacollector.collect_final(self)
+            self.close()
@@ -13,6 +13,7 @@ requires = ["click", "cookiecutter", "networkx", "numpy", "pandas", "tornado", "
 extras_require = {
     "dev": ["black", "coverage", "flake8", "pytest >= 4.6", "pytest-cov", "sphinx"],
     "docs": ["sphinx", "ipython"],
+    "io": ["pyarrow"],
 }
 
 version = ""
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The predator_prey package lives in its own project directory
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), os.pardir, "predator_prey"
+    ),
+)
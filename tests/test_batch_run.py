@@ -0,0 +1,282 @@
+import os
+import tempfile
+
+import pandas as pd
+import pytest
+
+from mesa import Agent, Model, batch_run, batch_run_to_file
+from mesa.batchrunner import _ResultCache, _run_key
+from mesa.datacollection import DataCollector
+from mesa.time import BaseScheduler
+
+
+class MockAgent(Agent):
+    def step(self):
+        pass
+
+
+class MockModel(Model):
+    def __init__(self, n_agents=2, seed=None):
+        super().__init__()
+        self.schedule = BaseScheduler(self)
+        for i in range(n_agents):
+            self.schedule.add(MockAgent(i, self))
+        self.datacollector = DataCollector(
+            model_reporters={"Agents": lambda m: m.schedule.get_agent_count()}
+        )
+        self.running = True
+        self.datacollector.collect(self)
+
+    def step(self):
+        self.schedule.step()
+        self.datacollector.collect(self)
+
+
+def test_checkpoint_only_replays_runs_of_the_current_sweep(tmp_path):
+    parameters = {"n_agents": [1, 2]}
+    first = batch_run(
+        MockModel,
+        parameters,
+        max_steps=5,
+        display_progress=False,
+        checkpoint_dir=str(tmp_path),
+    )
+    second = batch_run(
+        MockModel,
+        parameters,
+        max_steps=10,
+        display_progress=False,
+        checkpoint_dir=str(tmp_path),
+    )
+    assert sorted(row["RunId"] for row in first) == [0, 1]
+    assert sorted(row["RunId"] for row in second) == [0, 1]
+    assert {row["Step"] for row in second} == {10}
+
+    resumed = batch_run(
+        MockModel,
+        parameters,
+        max_steps=5,
+        display_progress=False,
+        checkpoint_dir=str(tmp_path),
+    )
+    assert sorted(resumed, key=lambda row: row["RunId"]) == sorted(
+        first, key=lambda row: row["RunId"]
+    )
+
+
+class MockAgentModel(MockModel):
+    def __init__(self, n_agents=2, seed=None):
+        super().__init__(n_agents, seed)
+        self.datacollector = DataCollector(
+            model_reporters={"Agents": lambda m: m.schedule.get_agent_count()},
+            agent_reporters={"Wealth": lambda a: a.unique_id * 10},
+        )
+        self.datacollector.collect(self)
+
+
+@pytest.mark.parametrize("extension", [".csv", ".parquet", ".arrow"])
+def test_batch_run_to_file_keeps_the_agent_columns_of_later_chunks(tmp_path, extension):
+    if extension != ".csv":
+        pytest.importorskip("pyarrow")
+    path = str(tmp_path / ("runs" + extension))
+    rows = batch_run_to_file(
+        MockAgentModel,
+        {"n_agents": [0, 2]},
+        path,
+        buffer_rows=1,
+        max_steps=2,
+        number_processes=1,
+        display_progress=False,
+    )
+    if extension == ".csv":
+        df = pd.read_csv(path)
+    elif extension == ".parquet":
+        df = pd.read_parquet(path)
+    else:
+        import pyarrow
+
+        with pyarrow.ipc.open_stream(path) as reader:
+            df = reader.read_pandas()
+    assert list(df.columns) == [
+        "RunId",
+        "iteration",
+        "Step",
+        "n_agents",
+        "Agents",
+        "AgentID",
+        "Wealth",
+    ]
+    assert len(df) == rows == 1 + 2
+    agents = df[df["n_agents"] == 2]
+    assert agents["AgentID"].tolist() == [0, 1]
+    assert agents["Wealth"].tolist() == [0, 10]
+    assert df[df["n_agents"] == 0]["AgentID"].isna().all()
+
+
+class ConfiguredModel(MockModel):
+    factor = 1
+
+    def __init__(self, n_agents=2, seed=None):
+        super().__init__(n_agents, seed)
+        self.datacollector = DataCollector(
+            model_reporters={"Agents": lambda m: m.factor * len(m.schedule.agents)}
+        )
+        self.datacollector.collect(self)
+
+
+def test_cache_is_invalidated_by_class_attribute_configuration(tmp_path):
+    def run():
+        return batch_run(
+            ConfiguredModel,
+            {"n_agents": 2, "seed": 1},
+            max_steps=3,
+            number_processes=1,
+            display_progress=False,
+            cache_dir=str(tmp_path),
+        )
+
+    assert run()[0]["Agents"] == 2
+    ConfiguredModel.factor = 5
+    try:
+        assert run()[0]["Agents"] == 10
+    finally:
+        ConfiguredModel.factor = 1
+    assert run()[0]["Agents"] == 2
+
+
+def test_checkpoint_reruns_runs_of_another_class_attribute_configuration(tmp_path):
+    def run():
+        return batch_run(
+            ConfiguredModel,
+            {"n_agents": [1, 2]},
+            max_steps=3,
+            number_processes=1,
+            display_progress=False,
+            checkpoint_dir=str(tmp_path),
+        )
+
+    assert sorted(row["Agents"] for row in run()) == [1, 2]
+    ConfiguredModel.factor = 5
+    try:
+        assert sorted(row["Agents"] for row in run()) == [5, 10]
+    finally:
+        ConfiguredModel.factor = 1
+    assert sorted(row["Agents"] for row in run()) == [1, 2]
+
+
+class SpillingModel(MockModel):
+    spill_dir = None
+
+    def __init__(self, n_agents=2, seed=None):
+        super().__init__(n_agents, seed)
+        self.datacollector = DataCollector(
+            model_reporters={"Steps": lambda m: m.schedule.steps},
+            agent_reporters={"Wealth": lambda a: a.unique_id + a.model.schedule.steps},
+            spill_dir=self.spill_dir and tempfile.mkdtemp(dir=self.spill_dir),
+            spill_every=3,
+            memory_window=2,
+        )
+        self.datacollector.collect(self)
+
+    def close(self):
+        self.datacollector.remove_spill()
+
+
+@pytest.mark.parametrize("collection_schedule", [None, 4])
+def test_batch_run_reads_spilled_runs_and_removes_their_spill(
+    tmp_path, monkeypatch, collection_schedule
+):
+    def load_history(self):
+        raise AssertionError("batch_run loaded the whole history")
+
+    monkeypatch.setattr(DataCollector, "load_history", load_history)
+
+    def run():
+        return batch_run(
+            SpillingModel,
+            {"n_agents": [1, 3]},
+            max_steps=10,
+            data_collection_period=2,
+            number_processes=1,
+            display_progress=False,
+            collection_schedule=collection_schedule,
+        )
+
+    expected = run()
+    SpillingModel.spill_dir = str(tmp_path)
+    try:
+        assert run() == expected
+    finally:
+        SpillingModel.spill_dir = None
+    assert os.listdir(tmp_path) == []
+    assert {row["Wealth"] - row["AgentID"] for row in expected} == {
+        row["Steps"] for row in expected
+    }
+
+
+def test_cache_and_checkpoint_keys_identify_the_run(tmp_path):
+    cache = _ResultCache(str(tmp_path), 1 << 20)
+    kwargs = {"n_agents": 2, "seed": 1}
+
+    def keys(model_cls=ConfiguredModel, kwargs=kwargs, *args, run_id=0, **kwds):
+        description = {"max_steps": 5, "data_collection_period": 1, **kwds}
+        return (
+            cache.key(model_cls, kwargs, *args, **description),
+            _run_key(model_cls, (run_id, 0, kwargs), *args, **description),
+        )
+
+    key = keys()
+    assert keys(kwargs={"seed": 1, "n_agents": 2}) == key
+    others = [
+        keys(MockModel),
+        keys(kwargs={"n_agents": 2, "seed": 2}),
+        keys(kwargs={"n_agents": 3, "seed": 1}),
+        keys(max_steps=6),
+        keys(data_collection_period=2),
+        keys(collection_schedule=2),
+    ]
+    ConfiguredModel.factor = 2
+    try:
+        others.append(keys())
+    finally:
+        ConfiguredModel.factor = 1
+    assert keys() == key
+    for other in others:
+        assert other[0] != key[0] and other[1] != key[1]
+    # The cache holds results by run description, the checkpoint by run
+    assert keys(run_id=1)[0] == key[0]
+    assert keys(run_id=1)[1] != key[1]
+
+
+# Not a class attribute, which would be part of the cache key
+model_runs = []
+
+
+class CountingModel(MockModel):
+    def __init__(self, n_agents=2, seed=None):
+        super().__init__(n_agents, seed)
+        model_runs.append(n_agents)
+
+
+def test_cached_runs_are_not_run_again(tmp_path):
+    def run(parameters):
+        return batch_run(
+            CountingModel,
+            parameters,
+            max_steps=3,
+            number_processes=1,
+            display_progress=False,
+            cache_dir=str(tmp_path),
+        )
+
+    model_runs.clear()
+    first = run({"n_agents": [1, 2], "seed": 1})
+    assert model_runs == [1, 2]
+    assert run({"n_agents": [1, 2], "seed": 1}) == first
+    assert model_runs == [1, 2]
+    run({"n_agents": [2, 3], "seed": 1})
+    assert model_runs == [1, 2, 3]
+    # Runs without a seed are never cached
+    run({"n_agents": 2})
+    run({"n_agents": 2})
+    assert model_runs == [1, 2, 3, 2, 2]
@@ -0,0 +1,132 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mesa import Agent, Model
+from mesa.datacollection import DataCollector, _AgentDelta
+from mesa.time import BaseScheduler
+
+
+class GrowingAgent(Agent):
+    def __init__(self, unique_id, model):
+        super().__init__(unique_id, model)
+        self.size = unique_id
+
+    def step(self):
+        self.size += self.unique_id % 3
+
+
+class GrowingModel(Model):
+    def __init__(self, spill_dir=None, agent_keyframe_every=None):
+        super().__init__()
+        self.schedule = BaseScheduler(self)
+        self.datacollector = DataCollector(
+            model_reporters={
+                "Agents": lambda m: m.schedule.get_agent_count(),
+                "Step": lambda m: m.schedule.steps,
+            },
+            agent_reporters={"Size": "size"},
+            tables={"Births": ["step", "agent_id"]},
+            spill_dir=spill_dir,
+            spill_every=4,
+            memory_window=2,
+            agent_keyframe_every=agent_keyframe_every,
+        )
+        self.datacollector.collect(self)
+
+    def step(self):
+        # Agents are born on every other step and the oldest one dies on
+        # every third step
+        if self.schedule.steps % 2 == 0:
+            agent = GrowingAgent(self.next_id(), self)
+            self.schedule.add(agent)
+            self.datacollector.add_table_row(
+                "Births", {"step": self.schedule.steps, "agent_id": agent.unique_id}
+            )
+        if self.schedule.steps % 3 == 2:
+            self.schedule.remove(self.schedule.agents[0])
+        self.schedule.step()
+        self.datacollector.collect(self)
+
+
+def test_spilled_data_reads_back_like_data_kept_in_memory(tmp_path):
+    spill_dir = str(tmp_path / "spill")
+    spilled, in_memory = GrowingModel(spill_dir), GrowingModel()
+    for _ in range(30):
+        spilled.step()
+        in_memory.step()
+    dc, expected = spilled.datacollector, in_memory.datacollector
+    assert len(os.listdir(spill_dir)) == 7
+
+    pd.testing.assert_frame_equal(
+        dc.get_model_vars_dataframe(), expected.get_model_vars_dataframe()
+    )
+    pd.testing.assert_frame_equal(
+        dc.get_agent_vars_dataframe(), expected.get_agent_vars_dataframe()
+    )
+    pd.testing.assert_frame_equal(
+        pd.concat(dc.iter_agent_vars_dataframes()),
+        expected.get_agent_vars_dataframe(),
+    )
+    pd.testing.assert_frame_equal(
+        dc.get_table_dataframe("Births"), expected.get_table_dataframe("Births")
+    )
+    assert list(dc.model_vars["Step"]) == list(range(31))
+
+    dc.remove_spill()
+    assert not os.path.exists(spill_dir)
+    assert dc.spill_dir is None
+    # The collections in memory are left
+    pd.testing.assert_frame_equal(
+        dc.get_model_vars_dataframe(),
+        expected.get_model_vars_dataframe().iloc[-5:],
+    )
+
+
+@pytest.mark.parametrize("spill", [False, True])
+def test_delta_encoded_agent_records_rebuild_the_full_agent_table(tmp_path, spill):
+    spill_dir = str(tmp_path / "spill") if spill else None
+    encoded, full = GrowingModel(spill_dir, agent_keyframe_every=3), GrowingModel()
+    for _ in range(20):
+        encoded.step()
+        full.step()
+    expected = full.datacollector.get_agent_vars_dataframe()
+    dc = encoded.datacollector
+    if not spill:
+        assert any(
+            isinstance(record, _AgentDelta) for record in dc._agent_records.values()
+        )
+
+    pd.testing.assert_frame_equal(dc.get_agent_vars_dataframe(), expected)
+    steps = expected.index.unique("Step")
+    assert steps.tolist() == list(range(1, 21))
+    for step in steps:
+        pd.testing.assert_frame_equal(
+            dc.get_agent_vars_at(step), expected.loc[step], check_names=False
+        )
+    with pytest.raises(Exception):
+        dc.get_agent_vars_at(21)
+
+
+def test_agent_delta_round_trip():
+    previous = (
+        np.array([1, 2, 3, 4]),
+        np.array([1, 2, 3, 4]),
+        np.array(["a", "b", "c", "d"], dtype=object),
+    )
+    current = (
+        np.array([1, 3, 4, 7, 8]),
+        np.array([1.5, 3.0, 4.0, 7.0, 8.0]),
+        np.array(["a", "x", "d", "y", "z"], dtype=object),
+    )
+    delta = _AgentDelta.encode(previous, current)
+    assert delta.died.tolist() == [1]
+    assert delta.born[0].tolist() == [7, 8]
+    for rebuilt, column in zip(delta.apply(previous), current):
+        assert rebuilt.dtype == column.dtype
+        assert rebuilt.tolist() == column.tolist()
+    # Reordered agents do not follow by removals and additions
+    reordered = tuple(column[[1, 0, 2, 3, 4]] for column in current)
+    assert _AgentDelta.encode(previous, reordered) is None
@@ -0,0 +1,100 @@
+import gc
+import math
+import os
+
+import pandas as pd
+import pytest
+
+from mesa import batch_run
+from predator_prey.agents import Predator, Prey
+from predator_prey.events import EventLog
+from predator_prey.model import PredatorPrey
+
+PARAMETERS = {
+    "n_grid_cells_width": 20,
+    "n_grid_cells_height": 20,
+    "initial_prey": 100,
+    "initial_predators": 10,
+    "prey_reproduce": 0.05,
+    "predator_reproduce": 0.01,
+    "initial_energy_predators": 10.3,
+    "initial_energy_prey": 60.3,
+    "move_energy_predators": 0.1,
+    "move_energy_prey": 0.1,
+}
+
+
+def test_running_energy_totals_match_the_energies_of_the_agents():
+    model = PredatorPrey(**PARAMETERS, seed=0)
+    model.stop_conditions = []
+    for _ in range(150):
+        model.step()
+        for species in (Predator, Prey):
+            energies = [
+                agent.energy
+                for agent in model.schedule.agents_by_type[species].values()
+            ]
+            assert model.schedule.get_energy_count(species) == pytest.approx(
+                math.fsum(energies), rel=0, abs=1e-12
+            )
+            assert model.schedule.get_energy_count(species) == pytest.approx(
+                sum(energies), rel=1e-12
+            )
+    assert model.schedule.get_type_count(Predator) > 0
+
+
+class LoggedPredatorPrey(PredatorPrey):
+    log_events = True
+    event_log_capacity = 256
+
+
+def test_event_log_file_holds_every_event_of_a_batch_run(tmp_path):
+    path = tmp_path / "events.csv"
+    LoggedPredatorPrey.event_log_path = str(path)
+    try:
+        batch_run(
+            LoggedPredatorPrey,
+            {**PARAMETERS, "seed": 0},
+            number_processes=1,
+            max_steps=5,
+            display_progress=False,
+        )
+    finally:
+        LoggedPredatorPrey.event_log_path = None
+
+    model = LoggedPredatorPrey(**PARAMETERS, seed=0)
+    model.events = EventLog(1 << 20)
+    while model.running and model.schedule.steps <= 5:
+        model.step()
+    expected = model.events.to_dataframe()
+    assert len(expected) > LoggedPredatorPrey.event_log_capacity
+    pd.testing.assert_frame_equal(
+        pd.read_csv(path), expected, check_dtype=False, check_categorical=False
+    )
+
+
+class SpillingPredatorPrey(PredatorPrey):
+    collect_agent_vars = True
+
+
+def test_spill_directory_is_removed_when_the_model_is_closed(tmp_path):
+    SpillingPredatorPrey.spill_dir = str(tmp_path)
+    try:
+        closed = SpillingPredatorPrey(**PARAMETERS, seed=0)
+        dropped = SpillingPredatorPrey(**PARAMETERS, seed=0)
+    finally:
+        SpillingPredatorPrey.spill_dir = None
+    assert len(os.listdir(tmp_path)) == 2
+    for _ in range(3):
+        closed.step()
+    closed.datacollector.spill()
+    expected = closed.datacollector.get_agent_vars_dataframe()
+
+    closed.close()
+    del dropped
+    gc.collect()
+    assert os.listdir(tmp_path) == []
+    # The collections kept in memory are still there
+    pd.testing.assert_frame_equal(
+        closed.datacollector.get_agent_vars_at(3), expected.loc[3]
+    )
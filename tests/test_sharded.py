@@ -0,0 +1,66 @@
+import gc
+import multiprocessing
+
+from mesa import batch_run
+from predator_prey.sharded import PredatorPreySharded
+
+PARAMETERS = {
+    "n_grid_cells_width": 10,
+    "n_grid_cells_height": 10,
+    "initial_prey": 40,
+    "initial_predators": 5,
+    "prey_reproduce": 0.1,
+    "predator_reproduce": 0.02,
+    "initial_energy_predators": 10.0,
+    "initial_energy_prey": 60.0,
+    "move_energy_predators": 0.5,
+    "move_energy_prey": 0.5,
+}
+
+
+def test_batch_run_shuts_down_the_workers_of_runs_ending_at_max_steps():
+    results = batch_run(
+        PredatorPreySharded,
+        {**PARAMETERS, "seed": [0, 1]},
+        max_steps=5,
+        number_processes=1,
+        display_progress=False,
+    )
+    assert {row["Step"] for row in results} == {5}
+    assert multiprocessing.active_children() == []
+
+
+def test_workers_are_shut_down_when_the_model_goes_away():
+    model = PredatorPreySharded(**PARAMETERS, seed=0)
+    model.step()
+    assert len(multiprocessing.active_children()) == model.n_shards
+    del model
+    gc.collect()
+    assert multiprocessing.active_children() == []
+
+    with PredatorPreySharded(**PARAMETERS, seed=0) as model:
+        model.step()
+    assert multiprocessing.active_children() == []
+    model.step()
+
+
+def test_processes_give_the_same_run_as_a_single_process():
+    runs = []
+    for processes in (True, False):
+        with PredatorPreySharded(**PARAMETERS, seed=3, processes=processes) as model:
+            for _ in range(10):
+                model.step()
+            runs.append(model.datacollector.get_model_vars_dataframe())
+    assert runs[0].equals(runs[1])
+
+
+def test_workers_are_shut_down_when_the_run_stops():
+    model = PredatorPreySharded(**{**PARAMETERS, "initial_predators": 0}, seed=0)
+    assert len(multiprocessing.active_children()) == model.n_shards
+    model.step()
+    assert not model.running
+    assert multiprocessing.active_children() == []
+    # Closing again, or stepping on, keeps working in this process
+    model.close()
+    model.step()
+    assert multiprocessing.active_children() == []
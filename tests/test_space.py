@@ -0,0 +1,99 @@
+import itertools
+from random import Random
+
+import numpy as np
+
+from mesa import Agent, Model
+from mesa.space import MultiGrid
+
+
+def make_grid(**kwargs):
+    model = Model()
+    grid = MultiGrid(4, 3, True, **kwargs)
+    agents = [Agent(i, model) for i in range(6)]
+    for agent, pos in zip(agents, [(0, 0), (0, 0), (1, 2), (3, 1), (3, 1), (3, 1)]):
+        grid.place_agent(agent, pos)
+    return grid, agents
+
+
+def test_column_and_position_indexing_return_the_same_cells():
+    grid, agents = make_grid()
+    for x in range(grid.width):
+        assert len(grid[x]) == grid.height
+        assert list(grid[x]) == [grid[x, y] for y in range(grid.height)]
+        assert grid[x][1:] == grid[x, 1:]
+        for y in range(grid.height):
+            assert (
+                grid[x][y] == grid[x, y] == list(grid.iter_cell_list_contents((x, y)))
+            )
+    assert grid[3][1] == agents[3:]
+    assert grid[0][-3] == agents[:2]
+    assert grid[2][0] == []
+
+
+class Hunter(Agent):
+    pass
+
+
+def test_random_pick_of_a_type_follows_the_order_of_the_cell():
+    model = Model()
+    grid = MultiGrid(2, 2, True, track_types=True)
+    agents = [(Hunter if i % 3 else Agent)(i, model) for i in range(12)]
+    for agent in agents:
+        grid.place_agent(agent, (0, 0))
+    for agent in agents[1:9:2]:
+        grid.move_agent(agent, (1, 1))
+    grid.move_agent(agents[1], (0, 0))
+
+    for agent_type in (Agent, Hunter):
+        expected = [agent for agent in grid[0, 0] if type(agent) is agent_type]
+        assert grid.get_cell_type_contents((0, 0), agent_type) == expected
+        for seed in range(20):
+            picked = grid.random_cell_agent_of_type((0, 0), agent_type, Random(seed))
+            assert picked is Random(seed).choice(expected)
+
+
+def assert_indexes_match_a_scan(grid, agent_types):
+    empties = set()
+    for x in range(grid.width):
+        for y in range(grid.height):
+            cell = grid[x, y]
+            if not cell:
+                empties.add((x, y))
+            assert grid.occupancy[x, y] == len(cell)
+            for agent_type in agent_types:
+                expected = [agent for agent in cell if type(agent) is agent_type]
+                assert grid.get_cell_type_contents((x, y), agent_type) == expected
+                assert grid.get_cell_type_count((x, y), agent_type) == len(expected)
+                assert grid.get_layer_occupancy(agent_type)[x, y] == len(expected)
+    assert grid.empties == empties
+    assert grid.exists_empty_cells() == bool(empties)
+
+
+def test_type_and_occupancy_indexes_match_a_scan_of_the_cells():
+    model = Model()
+    random = Random(3)
+    rng = np.random.default_rng(3)
+    grid = MultiGrid(6, 5, True, track_types=True, track_occupancy=True)
+    agent_types = (Agent, Hunter)
+    ids = itertools.count()
+    placed = []
+    for i in range(40):
+        agent = agent_types[i % 2](next(ids), model)
+        grid.place_agent(agent, (random.randrange(6), random.randrange(5)))
+        placed.append(agent)
+    assert_indexes_match_a_scan(grid, agent_types)
+
+    for round_ in range(10):
+        for agent in random.sample(placed, 5):
+            grid.move_agent(agent, (random.randrange(6), random.randrange(5)))
+        grid.move_agents(placed[::3], rng.integers(-2, 3, size=(len(placed[::3]), 2)))
+        grid.random_move_agents(placed[1::3], True, True, rng)
+        removed = placed.pop(random.randrange(len(placed)))
+        grid.remove_agent(removed)
+        for pos in random.sample(sorted(grid.empties), min(2, len(grid.empties))):
+            agent = agent_types[round_ % 2](next(ids), model)
+            grid.place_agent(agent, pos)
+            placed.append(agent)
+        assert_indexes_match_a_scan(grid, agent_types)
+        assert grid.occupancy.sum() == len(placed)
@@ -0,0 +1,94 @@
+from mesa import Agent, Model
+from mesa.time import (
+    RandomActivationByType,
+    SimultaneousActivation,
+    TypeStagedActivation,
+)
+
+
+class Hunter(Agent):
+    def step(self):
+        self.model.log.append(self.unique_id)
+        if self.model.prey:
+            victim = self.random.choice(self.model.prey)
+            self.model.prey.remove(victim)
+            self.model.schedule.remove(victim)
+
+
+class Prey(Agent):
+    def step(self):
+        self.model.log.append(self.unique_id)
+
+
+class TypeModel(Model):
+    def __init__(self, deferred, seed=None):
+        super().__init__()
+        self.log = []
+        self.schedule = RandomActivationByType(self, deferred)
+        for i in range(5):
+            self.schedule.add(Hunter(i, self))
+        self.prey = [Prey(i, self) for i in range(5, 50)]
+        for prey in self.prey:
+            self.schedule.add(prey)
+
+    def step(self):
+        self.schedule.step(shuffle_types=False)
+
+
+def test_deferred_per_type_activation_matches_immediate():
+    runs = []
+    for deferred in (False, True):
+        model = TypeModel(deferred, seed=42)
+        for _ in range(5):
+            model.step()
+        runs.append(
+            (model.log, sorted(agent.unique_id for agent in model.schedule.agents))
+        )
+    assert runs[0] == runs[1]
+
+
+class Herd(Agent):
+    def step(self):
+        self.model.log.append(("step", self.unique_id))
+
+    @classmethod
+    def step_vectorized(cls, agents):
+        agents[0].model.log.append(("vectorized", len(agents)))
+
+
+def test_type_staged_activation_only_calls_the_vectorized_step_if_asked_to():
+    logs = []
+    for vectorized in (False, True):
+        model = Model()
+        model.log = []
+        schedule = TypeStagedActivation(model, vectorized=vectorized)
+        for i in range(3):
+            schedule.add(Herd(i, model))
+        schedule.step()
+        logs.append(model.log)
+    assert sorted(logs[0]) == [("step", 0), ("step", 1), ("step", 2)]
+    assert logs[1] == [("vectorized", 3)]
+
+
+class Duelist(Agent):
+    def step(self):
+        self.model.log.append(("step", self.unique_id))
+        rival = self.model.rivals.pop(self.unique_id, None)
+        if rival is not None:
+            self.model.schedule.remove(rival)
+
+    def advance(self):
+        self.model.log.append(("advance", self.unique_id))
+
+
+def test_simultaneous_activation_skips_agents_removed_during_the_step():
+    model = Model()
+    model.log = []
+    model.schedule = SimultaneousActivation(model, deferred=True)
+    duelists = [Duelist(i, model) for i in range(3)]
+    for duelist in duelists:
+        model.schedule.add(duelist)
+    model.rivals = {0: duelists[1]}
+    model.schedule.step()
+    assert model.log == [("step", 0), ("step", 2), ("advance", 0), ("advance", 2)]
+    assert model.schedule.get_agent_count() == 2